@@ -1,26 +1,80 @@
 import os
+import sys
+import time
+import logging
 from google.adk.agents import Agent
-from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.tools.mcp_tool.mcp_toolset import McpToolset
 from google.adk.tools.mcp_tool.mcp_session_manager import StreamableHTTPServerParams
+from mcp import StdioServerParameters
 
-# Create the MCP toolset connection
-mcp_toolset = MCPToolset(
-    connection_params=StreamableHTTPServerParams(
-        url="http://localhost:8082/mcp/"  # Match your MCP server URL
+# http: a separately started server; stdio: the agent launches the server as a
+# child process; inprocess: the server runs inside the agent process
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "http")
+MCP_SERVER_URL = os.getenv("MCP_SERVER_URL", "http://localhost:8082/mcp/")
+PEGA_MCP_DIR = os.getenv("PEGA_MCP_DIR", os.path.join(os.path.dirname(__file__), "..", "..", "pega-mcp"))
+# Seconds before the case types held in session state are read again
+CASE_TYPES_TTL = int(os.getenv("CASE_TYPES_TTL", "300"))
+# The server's name for the pega://case-types resource
+CASE_TYPES_RESOURCE = "get_case_types_resource"
+
+logger = logging.getLogger(__name__)
+
+def create_mcp_toolset():
+    """Connect to the Pega MCP server over the configured transport"""
+    if MCP_TRANSPORT == "inprocess":
+        from .inprocess import InProcessToolset
+        return InProcessToolset(PEGA_MCP_DIR)
+    if MCP_TRANSPORT == "stdio":
+        server_dir = os.path.abspath(PEGA_MCP_DIR)
+        return McpToolset(
+            connection_params=StdioServerParameters(
+                command=sys.executable,
+                args=[os.path.join(server_dir, "server.py")],
+                cwd=server_dir,
+                env={**os.environ, "MCP_TRANSPORT": "stdio"}
+            )
+        )
+    return McpToolset(
+        connection_params=StreamableHTTPServerParams(
+            url=MCP_SERVER_URL  # Match your MCP server URL
+        )
     )
-)
 
+# Create the MCP toolset connection
+mcp_toolset = create_mcp_toolset()
 
-root_agent = Agent(
-    model='gemini-2.0-flash',
-    name='pega_adk_agent',
-    description='Agent for Pega case management via MCP',
-    instruction="""
+async def load_case_types(callback_context: CallbackContext):
+    """Put case types from pega://case-types into session state, unless they are still fresh"""
+    state = callback_context.state
+    if state.get("case_types") and time.time() - state.get("case_types_loaded_at", 0) < CASE_TYPES_TTL:
+        return None
+    try:
+        contents = await mcp_toolset.read_resource(CASE_TYPES_RESOURCE)
+    except Exception as e:
+        logger.warning(f"Could not load case types: {str(e)}")
+        return None
+    case_types = "".join(getattr(content, "text", "") for content in contents)
+    # Error text from the resource is left out, so the agent falls back to the tool
+    if case_types.startswith("Available Case Types:"):
+        state["case_types"] = case_types
+        state["case_types_loaded_at"] = time.time()
+    return None
+
+def build_instruction(context: ReadonlyContext) -> str:
+    """Agent instruction with the session's case types appended"""
+    case_types = context.state.get("case_types")
+    if case_types:
+        return INSTRUCTION + f"\n    Available case types (loaded from Pega for this session):\n{case_types}"
+    return INSTRUCTION + "\n    Available case types have not been loaded - call get_case_types_tool when you need them.\n"
+
+INSTRUCTION = """
     You are a Pega case management assistant. Strictly follow these rules:
     
     1. Directly use tools for these specific requests:
        - Connection checks: "verify connection", "test connectivity", "check pega status"
-       - Case types: "list case types", "show case types", "get case types"
+       - Case types: "list case types", "show case types", "get case types" (answer from the available case types below)
        - Case creation: "create case", "start a new case", "open new case"
        
        - IMPORTANT: ALL responses must be based on actual tool responses only
@@ -28,21 +82,25 @@ root_agent = Agent(
        - If a tool fails or returns no data, inform the user about the issue rather than making up information
     
     2. For case creation and case type listing:
-       - ALWAYS use the get_case_types_tool to fetch actual case types from Pega
+       - Use the available case types listed at the end of these instructions - they were loaded from Pega for this session
+       - Call get_case_types_tool only if that list is missing, the user asks to refresh case types, or Pega rejects a case type
        - NEVER assume, guess, or make up case types
        - ONLY show case types that are actually returned by the Pega system
        
        - If user mentions specific loan types (e.g., "Home loan", "secured loan", "unsecured loan"):
-         * First, get the list of available case types using get_case_types_tool
-         * Identify the most suitable case type by matching keywords from the actual returned data
+         * Call match_case_type_tool with the user's phrase to get a ranked shortlist
+         * Take the top candidate when its score clearly leads, otherwise offer the shortlist
          * Confirm the match with user before proceeding
          * If no clear match found, show all available case types as a bulleted list and ask user to select
        
        - If no specific case type mentioned:
-         * Get the list of available case types using get_case_types_tool
+         * Take the available case types
          * Display them as a bulleted list
          * Ask user to select a case type from the list
        
+       - If the user also wants the new case submitted or moved to the next stage, use create_and_advance_case_tool
+         with the steps they asked for, instead of creating the case and advancing it with separate calls
+       
        - Always show case types in this format:
          • Case Type Name (ID: case_type_id)
          • Case Type Name (ID: case_type_id)
@@ -73,7 +131,14 @@ root_agent = Agent(
     
     5. Tool listing:
        - If asked about capabilities: Return ONLY tool names in this format:
-         "Available tools: verify_pega_connectivity_tool, get_case_types_tool, create_case_tool"
-    """,
+         "Available tools: verify_pega_connectivity_tool, get_case_types_tool, match_case_type_tool, create_case_tool, create_and_advance_case_tool"
+    """
+
+root_agent = Agent(
+    model='gemini-2.0-flash',
+    name='pega_adk_agent',
+    description='Agent for Pega case management via MCP',
+    instruction=build_instruction,
+    before_agent_callback=load_case_types,
     tools=[mcp_toolset]
 ) 
\ No newline at end of file
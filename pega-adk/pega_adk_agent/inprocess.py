@@ -0,0 +1,107 @@
+"""
+In-Process MCP Toolset
+
+Loads the Pega MCP server's FastMCP instance into the agent's own process and
+talks to it over in-memory streams, so tool calls skip HTTP framing and
+per-request session negotiation. The server's lifespan (connection pool,
+token refresher, health prober) runs inside the agent process.
+"""
+
+import os
+import sys
+import asyncio
+from contextlib import AsyncExitStack
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from fastmcp import Client
+from mcp import ClientSession
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.base_toolset import BaseToolset
+from google.adk.tools.mcp_tool.mcp_tool import MCPTool
+
+def load_server(server_dir: str):
+    """Import pega-mcp/server.py with its own .env"""
+    server_dir = os.path.abspath(server_dir)
+    load_dotenv(os.path.join(server_dir, ".env"))
+    if server_dir not in sys.path:
+        sys.path.insert(0, server_dir)
+    import server
+    return server.mcp
+
+class InProcessSessionManager:
+    """One in-memory session, opened on first use
+
+    The client's streams and the server's lifespan run in anyio task groups,
+    which must be entered and exited by the same task. A runner task owns
+    them: it opens the client, hands out its session and keeps it open until
+    close() signals it to exit.
+    """
+
+    def __init__(self, server_dir: str):
+        self._server_dir = server_dir
+        self._session: Optional[ClientSession] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._stop = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    async def _run(self, opened: asyncio.Future) -> None:
+        """Open the client, publish its session and close it again - all in this task"""
+        try:
+            async with AsyncExitStack() as stack:
+                client = await stack.enter_async_context(Client(load_server(self._server_dir)))
+                opened.set_result(client.session)
+                await self._stop.wait()
+        except Exception as e:
+            if opened.done():
+                raise
+            opened.set_exception(e)
+
+    async def create_session(self, headers=None) -> ClientSession:
+        async with self._lock:
+            if self._runner is None or self._runner.done():
+                self._stop = asyncio.Event()
+                opened = asyncio.get_running_loop().create_future()
+                self._runner = asyncio.create_task(self._run(opened))
+                self._session = await opened
+            return self._session
+
+    async def close(self) -> None:
+        async with self._lock:
+            if self._runner is not None:
+                self._stop.set()
+                await self._runner
+                self._runner = None
+                self._session = None
+
+class InProcessTool(MCPTool):
+    """MCPTool calling the in-memory session directly - it has no pool to check sessions in and out of"""
+
+    async def _run_async_impl(self, *, args, tool_context, credential) -> Dict[str, Any]:
+        session = await self._mcp_session_manager.create_session()
+        response = await session.call_tool(self._mcp_tool.name, arguments=args)
+        return response.model_dump(exclude_none=True, mode="json")
+
+class InProcessToolset(BaseToolset):
+    """The Pega MCP tools, served by the server loaded into this process"""
+
+    def __init__(self, server_dir: str):
+        super().__init__()
+        self._session_manager = InProcessSessionManager(server_dir)
+
+    async def get_tools(self, readonly_context=None) -> List[BaseTool]:
+        session = await self._session_manager.create_session()
+        result = await session.list_tools()
+        return [InProcessTool(mcp_tool=tool, mcp_session_manager=self._session_manager) for tool in result.tools]
+
+    async def read_resource(self, name: str, readonly_context=None) -> List[Any]:
+        """Contents of the named resource, like McpToolset.read_resource"""
+        session = await self._session_manager.create_session()
+        resources = (await session.list_resources()).resources
+        uri = next((r.uri for r in resources if r.name == name), None)
+        if uri is None:
+            raise ValueError(f"Resource with name '{name}' not found.")
+        return (await session.read_resource(uri)).contents
+
+    async def close(self) -> None:
+        await self._session_manager.close()
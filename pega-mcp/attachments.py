@@ -0,0 +1,265 @@
+"""
+Attachments and Documents - Streaming Transfers
+
+Uploads are sent as a hand-built multipart body read from disk one chunk at a
+time (memory-mapped for large files). Downloads are streamed straight to disk
+and can be read back as chunked MCP resources, so memory use stays flat
+regardless of file size. Files are only read from UPLOAD_DIR and written to
+DOWNLOAD_DIR, both relative to this module unless absolute. Transfers are
+scheduled as bulk work, since each holds a request slot until it is done.
+"""
+
+import os
+import mmap
+import time
+import uuid
+import base64
+import asyncio
+import logging
+from urllib.parse import quote
+from typing import Dict, Any, AsyncIterator
+
+import httpx
+from tools import config, local_path, pega_request, fetch_reference_json, format_error, case_path, note_case_write
+from scheduler import BULK, use_priority
+
+logger = logging.getLogger(__name__)
+
+def _transfer_timeout() -> httpx.Timeout:
+    """Connect quickly, but allow long reads/writes for large files"""
+    return httpx.Timeout(config.TIMEOUT, read=config.TRANSFER_TIMEOUT, write=config.TRANSFER_TIMEOUT)
+
+def _root_dir(path: str) -> str:
+    root = os.path.realpath(local_path(path))
+    os.makedirs(root, exist_ok=True)
+    return root
+
+def _download_dir() -> str:
+    return _root_dir(config.DOWNLOAD_DIR)
+
+def _inside(root: str, path: str, setting: str) -> str:
+    """Resolve path against root, refusing anything (.., absolute paths, symlinks) that ends up outside it"""
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError(f"{path} is outside {setting} ({root})")
+    return resolved
+
+# ============================================================================
+# Upload
+# ============================================================================
+
+async def _iter_file(path: str, size: int) -> AsyncIterator[bytes]:
+    """Read a local file chunk by chunk - memory-mapped above MMAP_THRESHOLD"""
+    chunk_size = config.ATTACHMENT_CHUNK_SIZE
+    with open(path, "rb") as f:
+        if size >= config.MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for offset in range(0, size, chunk_size):
+                    yield await asyncio.to_thread(mm.__getitem__, slice(offset, offset + chunk_size))
+        else:
+            while True:
+                chunk = await asyncio.to_thread(f.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+async def _upload_file(file_path: str, name: str) -> httpx.Response:
+    """Stream a file to POST /attachments/upload as multipart/form-data"""
+    size = os.path.getsize(file_path)
+    boundary = uuid.uuid4().hex
+    safe_name = name.replace('"', "'")
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="content"; filename="{safe_name}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+
+    async def body() -> AsyncIterator[bytes]:
+        yield head
+        async for chunk in _iter_file(file_path, size):
+            yield chunk
+        yield tail
+
+    headers = {
+        "Content-Type": f"multipart/form-data; boundary={boundary}",
+        "Content-Length": str(len(head) + size + len(tail))
+    }
+    # The body is a one-shot stream, so a failed upload is not replayed. File
+    # transfers hold a slot for their whole duration, so they queue as bulk work
+    with use_priority(BULK):
+        return await pega_request("POST", "/attachments/upload", headers=headers, content=body(),
+                                  timeout=_transfer_timeout(), retry=False)
+
+async def upload_attachment(case_id: str, file_path: str, category: str = "File", name: str = "") -> str:
+    """Upload a file from UPLOAD_DIR and attach it to a case"""
+    try:
+        file_path = _inside(_root_dir(config.UPLOAD_DIR), file_path, "UPLOAD_DIR")
+    except ValueError as e:
+        return f"Cannot upload: {str(e)}"
+    if not os.path.isfile(file_path):
+        return f"File not found: {file_path}"
+    name = name or os.path.basename(file_path)
+
+    try:
+        start_time = time.time()
+        response = await _upload_file(file_path, name)
+        if response.status_code not in [200, 201]:
+            return format_error(f"Failed to upload file with status code {response.status_code}", response)
+        upload_id = response.json().get('ID', '')
+        upload_time = time.time() - start_time
+
+        payload = {"attachments": [{"type": "File", "category": category, "name": name, "ID": upload_id}]}
+        response = await pega_request("POST", f"{case_path(case_id)}/attachments", json=payload)
+        note_case_write(case_id, response)
+
+        if response.status_code in [200, 201]:
+            size_mb = os.path.getsize(file_path) / (1024 * 1024)
+            output = f"Attached {name} ({size_mb:.1f} MB) to case {case_id}, uploaded in {upload_time:.1f}s"
+        else:
+            output = format_error(f"Failed to attach file with status code {response.status_code}", response)
+
+        return output
+
+    except httpx.ConnectError as e:
+        error_msg = f"Connection error to Pega Platform: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+    except httpx.TimeoutException as e:
+        error_msg = f"Timeout transferring file to Pega Platform after {config.TRANSFER_TIMEOUT}s"
+        logger.error(error_msg)
+        return error_msg
+    except Exception as e:
+        error_msg = f"Error uploading attachment: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+async def get_attachment_categories(case_id: str) -> str:
+    """Get the attachment categories available on a case"""
+    try:
+        data, response = await fetch_reference_json(f"{case_path(case_id)}/attachment_categories")
+
+        if data is not None:
+            categories = data.get('attachment_categories', data.get('attachmentCategories', [])) or []
+            if categories:
+                output = f"Attachment categories for case {case_id}:\n"
+                for category in categories:
+                    output += f"  - {category.get('name', 'Unknown')} (ID: {category.get('ID', category.get('id', ''))})\n"
+            else:
+                output = f"No attachment categories for case {case_id}"
+        else:
+            output = format_error(f"Failed to get attachment categories with status code {response.status_code}", response)
+
+        return output
+
+    except httpx.ConnectError as e:
+        error_msg = f"Connection error to Pega Platform: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+    except httpx.TimeoutException as e:
+        error_msg = f"Timeout connecting to Pega Platform after {config.TIMEOUT}s"
+        logger.error(error_msg)
+        return error_msg
+    except Exception as e:
+        error_msg = f"Error getting attachment categories: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+# ============================================================================
+# Download
+# ============================================================================
+
+async def _stream_to_file(path: str, dest_path: str) -> Dict[str, Any]:
+    """Stream a GET response body to disk.
+
+    Pega may return file content base64-encoded; that is decoded on the fly
+    in 4-character aligned blocks.
+    """
+    start_time = time.time()
+    # The slot is held until the body has been read, so transfers queue as bulk work
+    with use_priority(BULK):
+        response = await pega_request("GET", path, headers={"Accept": "*/*"}, timeout=_transfer_timeout(), stream=True)
+
+    try:
+        if response.status_code != 200:
+            await response.aread()
+            return {"error": format_error(f"Download failed with status code {response.status_code}", response)}
+
+        is_base64 = response.headers.get("content-transfer-encoding", "").lower() == "base64"
+        pending = b""
+        written = 0
+        with open(dest_path, "wb") as f:
+            async for chunk in response.aiter_bytes(config.ATTACHMENT_CHUNK_SIZE):
+                if is_base64:
+                    pending += b"".join(chunk.split())
+                    cut = len(pending) - len(pending) % 4
+                    chunk, pending = base64.b64decode(pending[:cut]), pending[cut:]
+                await asyncio.to_thread(f.write, chunk)
+                written += len(chunk)
+            if is_base64 and pending:
+                chunk = base64.b64decode(pending)
+                await asyncio.to_thread(f.write, chunk)
+                written += len(chunk)
+    finally:
+        await response.aclose()
+
+    return {"path": dest_path, "bytes": written, "seconds": time.time() - start_time}
+
+async def _download(kind: str, path: str, item_id: str, dest_path: str) -> str:
+    """Download to dest_path inside DOWNLOAD_DIR, or to a file named after the ID there"""
+    download_dir = _download_dir()
+    try:
+        dest_path = _inside(download_dir, dest_path or os.path.basename(item_id), "DOWNLOAD_DIR")
+    except ValueError as e:
+        return f"Cannot download: {str(e)}"
+    if os.path.isdir(dest_path):
+        return f"Cannot download: {dest_path} is a directory"
+
+    try:
+        result = await _stream_to_file(path, dest_path)
+        if "error" in result:
+            return result["error"]
+
+        size_mb = result["bytes"] / (1024 * 1024)
+        output = f"Downloaded {kind} {item_id} ({size_mb:.1f} MB) to {result['path']} in {result['seconds']:.1f}s"
+        if os.path.dirname(dest_path) == download_dir:
+            chunks = max((result["bytes"] + config.ATTACHMENT_CHUNK_SIZE - 1) // config.ATTACHMENT_CHUNK_SIZE, 1)
+            output += f"\nRead it in {chunks} chunks from pega://downloads/{os.path.basename(dest_path)}/{{index}}"
+        return output
+
+    except httpx.ConnectError as e:
+        error_msg = f"Connection error to Pega Platform: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+    except httpx.TimeoutException as e:
+        error_msg = f"Timeout transferring file from Pega Platform after {config.TRANSFER_TIMEOUT}s"
+        logger.error(error_msg)
+        return error_msg
+    except Exception as e:
+        error_msg = f"Error downloading {kind}: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+async def download_attachment(attachment_id: str, dest_path: str = "") -> str:
+    """Stream attachment content to a local file"""
+    return await _download("attachment", f"/attachments/{quote(attachment_id, safe='')}", attachment_id, dest_path)
+
+async def download_document(document_id: str, dest_path: str = "") -> str:
+    """Stream document content to a local file"""
+    return await _download("document", f"/documents/{quote(document_id, safe='')}", document_id, dest_path)
+
+def read_download_chunk(file_name: str, index: int) -> bytes:
+    """Read one ATTACHMENT_CHUNK_SIZE chunk of a file in DOWNLOAD_DIR"""
+    if file_name != os.path.basename(file_name):
+        raise ValueError(f"Invalid download name: {file_name}")
+    path = _inside(_download_dir(), file_name, "DOWNLOAD_DIR")
+    offset = index * config.ATTACHMENT_CHUNK_SIZE
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if index < 0 or (offset >= size and size > 0):
+            raise ValueError(f"Chunk {index} out of range for {file_name}")
+        if size == 0:
+            return b""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[offset:offset + config.ATTACHMENT_CHUNK_SIZE]
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the Pega MCP Server
+
+Opens N concurrent MCP sessions against the server's streamable-HTTP endpoint
+and calls each tool in turn, reporting p50/p95/p99 latency, requests per
+second and errors per tool. When the server is pointed at mock_pega.py, the
+token refreshes seen during each tool's phase are reported too.
+
+With --transports, one session per transport calls each tool back to back
+instead, to compare per-call overhead of the in-process, stdio and
+streamable-HTTP transports against the same Pega backend.
+
+Usage:
+    python mock_pega.py --latency-ms 40 &
+    PEGA_BASE_URL=http://localhost:8090 python server.py &
+    python benchmark.py --sessions 20 --requests 50 --mock-url http://localhost:8090
+    PEGA_BASE_URL=http://localhost:8090 python benchmark.py --transports inprocess stdio http
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import Dict, Any, List, Optional
+
+import httpx
+from fastmcp import Client
+from fastmcp.client.transports import PythonStdioTransport
+
+# Tool name -> arguments used for each call
+DEFAULT_TOOLS: Dict[str, Dict[str, Any]] = {
+    "verify_pega_connectivity_tool": {},
+    "get_case_types_tool": {},
+    "create_case_tool": {"case_type_id": "UBANK-HOMELOAN-WORK"}
+}
+
+TRANSPORTS = ("inprocess", "stdio", "http")
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    index = min(int(round(pct / 100 * len(values) + 0.5)) - 1, len(values) - 1)
+    return values[max(index, 0)]
+
+async def get_mock_stats(mock_url: Optional[str]) -> Dict[str, Any]:
+    if not mock_url:
+        return {}
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"{mock_url}/mock/stats")
+        return response.json()
+
+async def run_session(url: str, tool: str, args: Dict[str, Any], requests: int,
+                      latencies: List[float], errors: List[str]) -> None:
+    """One MCP session calling a tool back to back"""
+    try:
+        async with Client(url) as client:
+            for _ in range(requests):
+                start_time = time.perf_counter()
+                try:
+                    result = await client.call_tool(tool, args, raise_on_error=False)
+                    if result.is_error:
+                        errors.append(str(result.content[0].text if result.content else "error"))
+                except Exception as e:
+                    errors.append(str(e))
+                latencies.append((time.perf_counter() - start_time) * 1000)
+    except Exception as e:
+        errors.append(f"session failed: {str(e)}")
+
+async def run_phase(url: str, tool: str, args: Dict[str, Any], sessions: int, requests: int,
+                    mock_url: Optional[str]) -> Dict[str, Any]:
+    """Load one tool with all sessions and collect its numbers"""
+    latencies: List[float] = []
+    errors: List[str] = []
+    before = await get_mock_stats(mock_url)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(run_session(url, tool, args, requests, latencies, errors) for _ in range(sessions)))
+    elapsed = time.perf_counter() - start_time
+
+    after = await get_mock_stats(mock_url)
+    latencies.sort()
+    return {
+        "tool": tool,
+        "calls": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": latencies[-1] if latencies else 0.0,
+        "token_refreshes": after.get("tokens_issued", 0) - before.get("tokens_issued", 0) if mock_url else None,
+        "pega_requests": after.get("requests", 0) - before.get("requests", 0) if mock_url else None,
+        "sample_error": errors[0] if errors else ""
+    }
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    print(f"\n{'='*100}")
+    print("BENCHMARK RESULTS")
+    print(f"{'='*100}")
+    print(f"{'Tool':<34}{'Calls':>7}{'Errors':>8}{'RPS':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'Tokens':>8}{'Pega':>7}")
+    for r in results:
+        tokens = "-" if r["token_refreshes"] is None else r["token_refreshes"]
+        pega = "-" if r["pega_requests"] is None else r["pega_requests"]
+        print(f"{r['tool']:<34}{r['calls']:>7}{r['errors']:>8}{r['rps']:>9.1f}"
+              f"{r['p50']:>9.1f}{r['p95']:>9.1f}{r['p99']:>9.1f}{tokens:>8}{pega:>7}")
+    for r in results:
+        if r["sample_error"]:
+            print(f"\n{r['tool']} sample error: {r['sample_error'][:200]}")
+
+# ============================================================================
+# Transport Comparison
+# ============================================================================
+
+def transport_client(transport: str, url: str) -> Client:
+    """MCP client for one transport - in-process and stdio load the server from this directory"""
+    if transport == "inprocess":
+        sys.path.insert(0, SERVER_DIR)
+        import server
+        return Client(server.mcp)
+    if transport == "stdio":
+        env = {**os.environ, "MCP_TRANSPORT": "stdio"}
+        return Client(PythonStdioTransport(os.path.join(SERVER_DIR, "server.py"), env=env, cwd=SERVER_DIR))
+    return Client(url)
+
+async def run_transport(transport: str, url: str, tools: List[str], tool_args: Dict[str, Dict[str, Any]],
+                        requests: int) -> List[Dict[str, Any]]:
+    """One session over one transport, calling each tool back to back after a warm-up call"""
+    results = []
+    start_time = time.perf_counter()
+    async with transport_client(transport, url) as client:
+        connect_ms = (time.perf_counter() - start_time) * 1000
+        for tool in tools:
+            args = tool_args.get(tool, {})
+            await client.call_tool(tool, args, raise_on_error=False)
+            latencies: List[float] = []
+            errors = 0
+            for _ in range(requests):
+                call_start = time.perf_counter()
+                result = await client.call_tool(tool, args, raise_on_error=False)
+                latencies.append((time.perf_counter() - call_start) * 1000)
+                errors += 1 if result.is_error else 0
+            latencies.sort()
+            results.append({
+                "transport": transport,
+                "tool": tool,
+                "connect_ms": connect_ms,
+                "calls": len(latencies),
+                "errors": errors,
+                "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95)
+            })
+    return results
+
+def print_transport_report(results: List[Dict[str, Any]]) -> None:
+    """Per-tool latency by transport, with the overhead over the fastest transport's p50"""
+    print(f"\n{'='*100}")
+    print("TRANSPORT COMPARISON")
+    print(f"{'='*100}")
+    print(f"{'Tool':<34}{'Transport':<12}{'Connect ms':>11}{'Calls':>7}{'Errors':>8}"
+          f"{'Mean ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'+p50 ms':>9}")
+    for tool in dict.fromkeys(r["tool"] for r in results):
+        rows = [r for r in results if r["tool"] == tool]
+        fastest = min(r["p50"] for r in rows)
+        for r in rows:
+            print(f"{tool:<34}{r['transport']:<12}{r['connect_ms']:>11.1f}{r['calls']:>7}{r['errors']:>8}"
+                  f"{r['mean']:>9.2f}{r['p50']:>9.2f}{r['p95']:>9.2f}{r['p50'] - fastest:>9.2f}")
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Load benchmark for the Pega MCP Server")
+    parser.add_argument("--url", default="http://localhost:8082/mcp/", help="MCP streamable-HTTP endpoint")
+    parser.add_argument("--sessions", type=int, default=10, help="Concurrent MCP sessions")
+    parser.add_argument("--requests", type=int, default=20, help="Calls per session per tool")
+    parser.add_argument("--tools", nargs="*", help="Tools to benchmark (default: core tools)")
+    parser.add_argument("--args", default="{}", help="JSON object of tool name -> arguments, merged over defaults")
+    parser.add_argument("--mock-url", help="mock_pega.py base URL, to report token refreshes and Pega requests")
+    parser.add_argument("--transports", nargs="*", choices=TRANSPORTS,
+                        help="Compare per-call overhead across these transports instead of load testing")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    tool_args = {**DEFAULT_TOOLS, **json.loads(args.args)}
+    tools = args.tools or list(DEFAULT_TOOLS)
+
+    if args.transports:
+        print(f"Comparing {', '.join(args.transports)} with {args.requests} sequential calls per tool")
+        results = []
+        for transport in args.transports:
+            print(f"Running {transport}...")
+            results.extend(await run_transport(transport, args.url, tools, tool_args, args.requests))
+        if args.json:
+            print(json.dumps(results, indent=2))
+        else:
+            print_transport_report(results)
+        return 1 if any(r["errors"] for r in results) else 0
+
+    print(f"Benchmarking {args.url} with {args.sessions} sessions x {args.requests} calls per tool")
+    results = []
+    for tool in tools:
+        print(f"Running {tool}...")
+        results.append(await run_phase(args.url, tool, tool_args.get(tool, {}), args.sessions, args.requests, args.mock_url))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+    return 1 if any(r["errors"] for r in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
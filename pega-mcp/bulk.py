@@ -0,0 +1,256 @@
+"""
+Bulk Case Actions - Background Jobs
+
+Large selections are split into chunks and each chunk is sent as one
+server-side bulk call (PATCH /cases) instead of one PATCH per case.
+"""
+
+import time
+import uuid
+import asyncio
+import logging
+from typing import Dict, Any, Optional, List, Callable, Awaitable
+
+import httpx
+from tools import config, current_target, pega_request, format_error, case_cache, case_path, shared_store
+from scheduler import BULK, use_priority
+
+logger = logging.getLogger(__name__)
+
+# Called with the job ID whenever a job makes progress
+JobUpdateCallback = Callable[[str], Awaitable[None]]
+
+# Jobs by ID - finished jobs are pruned beyond BULK_JOB_HISTORY
+_jobs: Dict[str, Dict[str, Any]] = {}
+
+MAX_JOB_ERRORS = 20
+
+# Seconds a job's status stays readable from other worker processes
+JOB_SNAPSHOT_TTL = 3600
+
+# ============================================================================
+# Pega Calls
+# ============================================================================
+
+async def get_bulk_actions(case_ids: List[str]) -> str:
+    """Get the bulk actions available for a selection of cases"""
+    payload = {"cases": [{"ID": case_id} for case_id in case_ids]}
+
+    try:
+        response = await pega_request("POST", "/cases/bulk-actions", json=payload)
+
+        if response.status_code == 200:
+            data = response.json()
+            actions = data.get('actions', data.get('data', {}).get('actions', []))
+
+            if actions:
+                output = f"Found {len(actions)} bulk actions:\n"
+                for i, action in enumerate(actions, 1):
+                    name = action.get('name', 'Unknown')
+                    action_id = action.get('ID', action.get('id', 'No ID'))
+                    output += f"  {i}. {name} (ID: {action_id})\n"
+            else:
+                output = "No bulk actions available for the selected cases"
+        else:
+            output = format_error(f"Failed to get bulk actions with status code {response.status_code}", response)
+
+        return output
+
+    except httpx.ConnectError as e:
+        error_msg = f"Connection error to Pega Platform: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+    except httpx.TimeoutException as e:
+        error_msg = f"Timeout connecting to Pega Platform after {config.TIMEOUT}s"
+        logger.error(error_msg)
+        return error_msg
+    except Exception as e:
+        error_msg = f"Error getting bulk actions: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+async def _perform_bulk_chunk(action_id: str, case_ids: List[str], content: Optional[Dict[str, Any]]) -> List[str]:
+    """Run one PATCH /cases call and return error messages for failed cases"""
+    payload: Dict[str, Any] = {
+        "actionID": action_id,
+        "cases": [{"ID": case_id} for case_id in case_ids]
+    }
+    if content:
+        payload["content"] = content
+
+    response = await pega_request("PATCH", "/cases", json=payload)
+    # Bulk responses do not carry the new case eTags
+    for case_id in case_ids:
+        case_cache.discard(case_path(case_id))
+
+    if response.status_code not in [200, 202, 207]:
+        error_msg = format_error(f"status code {response.status_code}", response)
+        return [f"{case_id}: {error_msg}" for case_id in case_ids]
+
+    # Multi-status responses report failures per case
+    errors = []
+    try:
+        data = response.json()
+    except ValueError:
+        data = {}
+    for item in data.get('cases', []) if isinstance(data, dict) else []:
+        if item.get('errors') or int(item.get('status', 200)) >= 400:
+            detail = item.get('errors') or f"status {item.get('status')}"
+            errors.append(f"{item.get('ID', 'Unknown')}: {detail}")
+    return errors
+
+# ============================================================================
+# Job Management
+# ============================================================================
+
+def _publish(job: Dict[str, Any]) -> None:
+    """Share the job's progress with other worker processes"""
+    shared_store.put_json(f"bulk-job:{job['id']}", {k: v for k, v in job.items() if k != "task"}, ttl=JOB_SNAPSHOT_TTL)
+
+def _prune_jobs() -> None:
+    """Drop the oldest finished jobs beyond BULK_JOB_HISTORY"""
+    finished = [j for j in _jobs.values() if j["status"] not in ("queued", "running")]
+    finished.sort(key=lambda j: j["created_at"])
+    for job in finished[:max(len(finished) - config.BULK_JOB_HISTORY, 0)]:
+        del _jobs[job["id"]]
+
+async def _run_job(job: Dict[str, Any], case_ids: List[str], content: Optional[Dict[str, Any]],
+                   on_update: Optional[JobUpdateCallback]) -> None:
+    """Process a job's chunks, BULK_CONCURRENCY chunk calls at a time"""
+    chunk_size = config.BULK_CHUNK_SIZE
+    chunks = [case_ids[i:i + chunk_size] for i in range(0, len(case_ids), chunk_size)]
+    semaphore = asyncio.Semaphore(config.BULK_CONCURRENCY)
+
+    async def notify() -> None:
+        _publish(job)
+        if on_update:
+            try:
+                await on_update(job["id"])
+            except Exception as e:
+                logger.debug(f"Bulk job update notification failed: {str(e)}")
+
+    async def run_chunk(chunk: List[str]) -> None:
+        async with semaphore:
+            try:
+                errors = await _perform_bulk_chunk(job["action_id"], chunk, content)
+            except httpx.TimeoutException:
+                errors = [f"{case_id}: timeout after {config.TIMEOUT}s" for case_id in chunk]
+            except Exception as e:
+                errors = [f"{case_id}: {str(e)}" for case_id in chunk]
+
+        job["processed"] += len(chunk)
+        job["failed"] += len(errors)
+        job["succeeded"] += len(chunk) - len(errors)
+        job["chunks_done"] += 1
+        job["errors"].extend(errors[:MAX_JOB_ERRORS - len(job["errors"])])
+        await notify()
+
+    job["status"] = "running"
+    job["started_at"] = time.time()
+    await notify()
+    try:
+        await asyncio.gather(*(run_chunk(chunk) for chunk in chunks))
+        job["status"] = "completed" if job["failed"] == 0 else "completed_with_errors"
+    except asyncio.CancelledError:
+        job["status"] = "cancelled"
+        raise
+    except Exception as e:
+        job["status"] = "failed"
+        job["errors"].append(str(e))
+        logger.error(f"Bulk job {job['id']} failed: {str(e)}")
+    finally:
+        job["finished_at"] = time.time()
+        logger.info(f"Bulk job {job['id']} {job['status']}: {job['succeeded']}/{job['total']} succeeded")
+        await notify()
+        _prune_jobs()
+
+async def submit_bulk_action(case_ids: List[str], action_id: str, content: Optional[Dict[str, Any]] = None,
+                             on_update: Optional[JobUpdateCallback] = None) -> str:
+    """Start a bulk action job and return its handle immediately"""
+    case_ids = list(dict.fromkeys(c for c in case_ids if c))
+    if not case_ids:
+        return "No cases to process"
+    if not action_id:
+        return "An action ID is required"
+
+    job_id = uuid.uuid4().hex[:12]
+    chunk_size = config.BULK_CHUNK_SIZE
+    job: Dict[str, Any] = {
+        "id": job_id,
+        "target": current_target().name,
+        "action_id": action_id,
+        "status": "queued",
+        "total": len(case_ids),
+        "processed": 0,
+        "succeeded": 0,
+        "failed": 0,
+        "chunks_done": 0,
+        "chunks_total": (len(case_ids) + chunk_size - 1) // chunk_size,
+        "errors": [],
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None
+    }
+    _jobs[job_id] = job
+    with use_priority(BULK):
+        job["task"] = asyncio.create_task(_run_job(job, case_ids, content, on_update))
+
+    return (f"Bulk job {job_id} submitted: {action_id} on {len(case_ids)} cases "
+            f"in {job['chunks_total']} chunks. Track it at pega://bulk-jobs/{job_id}")
+
+def format_job_status(job_id: str) -> str:
+    """Format the current progress of a job"""
+    job = _jobs.get(job_id) or shared_store.get_json(f"bulk-job:{job_id}")
+    if not job:
+        return f"Bulk job {job_id} not found"
+
+    end = job["finished_at"] or time.time()
+    elapsed = end - job["started_at"] if job["started_at"] else 0.0
+    percent = (job["processed"] / job["total"]) * 100 if job["total"] else 100.0
+
+    output = f"""Bulk Job: {job_id}
+Target: {job['target']}
+Action: {job['action_id']}
+Status: {job['status']}
+Progress: {job['processed']}/{job['total']} cases ({percent:.1f}%), {job['chunks_done']}/{job['chunks_total']} chunks
+Succeeded: {job['succeeded']}
+Failed: {job['failed']}
+Elapsed: {elapsed:.1f}s"""
+    if job["errors"]:
+        output += "\nErrors:\n" + "\n".join(f"  - {e}" for e in job["errors"])
+        if job["failed"] > len(job["errors"]):
+            output += f"\n  ... and {job['failed'] - len(job['errors'])} more"
+    return output
+
+def list_jobs() -> str:
+    """Summarize all known jobs"""
+    if not _jobs:
+        return "No bulk jobs"
+
+    output = f"Bulk jobs ({len(_jobs)}):\n"
+    for job in sorted(_jobs.values(), key=lambda j: j["created_at"], reverse=True):
+        output += f"- {job['id']}: {job['action_id']} {job['status']} ({job['processed']}/{job['total']})\n"
+    return output
+
+async def cancel_bulk_job(job_id: str) -> str:
+    """Cancel a running job - chunks already sent to Pega are not rolled back"""
+    job = _jobs.get(job_id)
+    if not job:
+        if shared_store.get_json(f"bulk-job:{job_id}"):
+            return f"Bulk job {job_id} runs in another worker process and can only be cancelled there"
+        return f"Bulk job {job_id} not found"
+    if job["status"] not in ("queued", "running"):
+        return f"Bulk job {job_id} already {job['status']}"
+
+    job["task"].cancel()
+    try:
+        await job["task"]
+    except asyncio.CancelledError:
+        pass
+    return f"Bulk job {job_id} cancelled after {job['processed']}/{job['total']} cases"
+
+async def shutdown_bulk_jobs() -> None:
+    """Cancel running jobs (called on server shutdown)"""
+    for job in list(_jobs.values()):
+        if job["status"] in ("queued", "running"):
+            await cancel_bulk_job(job["id"])
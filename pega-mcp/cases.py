@@ -0,0 +1,366 @@
+"""
+Case Details, Actions and Stages
+
+Case details are served from the case cache together with their eTag. Writes
+send that eTag as If-Match and feed the response back into the cache, so an
+update normally costs one round-trip instead of a GET followed by a PATCH.
+The same holds from step to step of a create-and-advance sequence. Only the
+data part of a case is kept; UI metadata is skipped while parsing.
+"""
+
+import time
+import logging
+from urllib.parse import quote
+from typing import Dict, Any, Optional, List, Tuple
+
+import httpx
+from metrics import metrics
+from tools import config, pega_request, fetch_reference_json, format_error, case_cache, case_path, note_case_write
+from payloads import parse_fields, project, stream_json, to_text
+
+logger = logging.getLogger(__name__)
+
+# What the case cache holds of a GET /cases/{id} response - the same as note_case_write keeps
+CASE_FIELDS = parse_fields("data")
+
+def _case_info(data: Dict[str, Any]) -> Dict[str, Any]:
+    return (data.get('data') or {}).get('caseInfo') or {}
+
+async def _case_etag(case_id: str) -> Optional[str]:
+    """eTag for optimistic locking - from the cache, else a GET that also fills it"""
+    key = case_path(case_id)
+    entry = case_cache.get(key)
+    if entry and entry.get("etag"):
+        metrics.inc("pega_case_etag_total", {"source": "cache"})
+        return entry["etag"]
+
+    metrics.inc("pega_case_etag_total", {"source": "fetch"})
+    data, _ = await fetch_reference_json(key, revalidate=True, cache=case_cache, fields=CASE_FIELDS)
+    entry = case_cache.get(key)
+    return entry.get("etag") if data is not None and entry else None
+
+async def write_case(case_id: str, method: str, path: str, **kwargs) -> httpx.Response:
+    """Send a write to a case with If-Match, retrying once on an eTag conflict"""
+    for attempt in range(2):
+        etag = await _case_etag(case_id)
+        headers = {"If-Match": etag} if etag else None
+        response = await pega_request(method, path, headers=headers, **kwargs)
+        note_case_write(case_id, response)
+
+        if response.status_code not in (409, 412) or attempt:
+            return response
+        # Someone else updated the case - the entry was dropped, so the next eTag is fresh
+        metrics.inc("pega_case_etag_conflicts_total")
+        logger.info(f"eTag conflict on {case_id}, retrying with a fresh eTag")
+    return response
+
+def _format_case(case_info: Dict[str, Any]) -> str:
+    output = f"Case {case_info.get('ID', 'Unknown')}: {case_info.get('name', '')}\n"
+    if case_info.get('caseTypeName'):
+        output += f"Type: {case_info['caseTypeName']} ({case_info.get('caseTypeID', '')})\n"
+    else:
+        output += f"Type: {case_info.get('caseTypeID', 'Unknown')}\n"
+    output += f"Status: {case_info.get('status', 'Unknown')}\n"
+    if case_info.get('stageLabel') or case_info.get('stageID'):
+        output += f"Stage: {case_info.get('stageLabel', case_info.get('stageID'))}\n"
+    if case_info.get('urgency'):
+        output += f"Urgency: {case_info['urgency']}\n"
+    if case_info.get('createTime'):
+        output += f"Created: {case_info['createTime']} by {case_info.get('createdBy', 'Unknown')}\n"
+    if case_info.get('lastUpdateTime'):
+        output += f"Updated: {case_info['lastUpdateTime']} by {case_info.get('lastUpdatedBy', 'Unknown')}\n"
+
+    assignments = case_info.get('assignments') or []
+    if assignments:
+        output += f"Assignments ({len(assignments)}):\n"
+        for assignment in assignments:
+            output += f"  - {assignment.get('name', 'Unknown')} (ID: {assignment.get('ID', '')})\n"
+
+    actions = case_info.get('availableActions') or []
+    if actions:
+        output += "Available actions: " + ", ".join(f"{a.get('name', '')} ({a.get('ID', '')})" for a in actions) + "\n"
+    return output
+
+async def get_case_details(case_id: str, refresh: bool = False, fields: str = "") -> str:
+    """Get case details - a summary, or JSON of just the comma-separated fields paths"""
+    try:
+        data, response = await fetch_reference_json(case_path(case_id), revalidate=refresh, cache=case_cache,
+                                                     fields=CASE_FIELDS)
+
+        if data is not None and fields:
+            output = to_text(project(data, parse_fields(fields)), config.MAX_OUTPUT_CHARS)
+        elif data is not None:
+            case_info = _case_info(data)
+            output = _format_case(case_info) if case_info else f"Case {case_id} returned no details"
+        else:
+            output = format_error(f"Failed to get case details with status code {response.status_code}", response)
+
+        return output
+
+    except httpx.ConnectError as e:
+        error_msg = f"Connection error to Pega Platform: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+    except httpx.TimeoutException as e:
+        error_msg = f"Timeout connecting to Pega Platform after {config.TIMEOUT}s"
+        logger.error(error_msg)
+        return error_msg
+    except Exception as e:
+        error_msg = f"Error getting case details: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+async def get_case_view(case_id: str, view_id: str, fields: str = "") -> str:
+    """Get a case view as JSON of the comma-separated fields paths - data only by default"""
+    try:
+        response = await pega_request("GET", f"{case_path(case_id)}/views/{quote(view_id, safe='')}", stream=True)
+        try:
+            if response.status_code != 200:
+                await response.aread()
+                return format_error(f"Failed to get case view with status code {response.status_code}", response)
+            data = await stream_json(response, parse_fields(fields or "data"))
+        finally:
+            await response.aclose()
+
+        return to_text(data, config.MAX_OUTPUT_CHARS)
+
+    except httpx.ConnectError as e:
+        error_msg = f"Connection error to Pega Platform: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+    except httpx.TimeoutException as e:
+        error_msg = f"Timeout connecting to Pega Platform after {config.TIMEOUT}s"
+        logger.error(error_msg)
+        return error_msg
+    except Exception as e:
+        error_msg = f"Error getting case view: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+async def get_participant_roles(case_id: str) -> str:
+    """Get the participant roles of a case"""
+    try:
+        data, response = await fetch_reference_json(f"{case_path(case_id)}/participant_roles")
+
+        if data is not None:
+            roles = data.get('participantRoles', data.get('participant_roles', [])) or []
+            if roles:
+                output = f"Participant roles for case {case_id}:\n"
+                for role in roles:
+                    output += f"  - {role.get('name', 'Unknown')} (ID: {role.get('ID', role.get('id', ''))})\n"
+            else:
+                output = f"No participant roles for case {case_id}"
+        else:
+            output = format_error(f"Failed to get participant roles with status code {response.status_code}", response)
+
+        return output
+
+    except httpx.ConnectError as e:
+        error_msg = f"Connection error to Pega Platform: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+    except httpx.TimeoutException as e:
+        error_msg = f"Timeout connecting to Pega Platform after {config.TIMEOUT}s"
+        logger.error(error_msg)
+        return error_msg
+    except Exception as e:
+        error_msg = f"Error getting participant roles: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+def _write_result(message: str, response: httpx.Response) -> str:
+    """Summarize a successful case write"""
+    try:
+        case_info = _case_info(response.json())
+    except ValueError:
+        case_info = {}
+    if case_info.get('status'):
+        message += f". Status: {case_info['status']}"
+    if case_info.get('stageLabel'):
+        message += f", Stage: {case_info['stageLabel']}"
+    return message
+
+async def perform_case_action(case_id: str, action_id: str, content: Optional[Dict[str, Any]] = None) -> str:
+    """Perform a case action"""
+    try:
+        response = await write_case(case_id, "PATCH", f"{case_path(case_id)}/actions/{quote(action_id, safe='')}",
+                                    json={"content": content or {}})
+
+        if response.status_code in [200, 201]:
+            output = _write_result(f"Action {action_id} performed on case {case_id}", response)
+        else:
+            output = format_error(f"Failed to perform action with status code {response.status_code}", response)
+
+        return output
+
+    except httpx.ConnectError as e:
+        error_msg = f"Connection error to Pega Platform: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+    except httpx.TimeoutException as e:
+        error_msg = f"Timeout connecting to Pega Platform after {config.TIMEOUT}s"
+        logger.error(error_msg)
+        return error_msg
+    except Exception as e:
+        error_msg = f"Error performing case action: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+async def change_case_stage(case_id: str, stage_id: str = "") -> str:
+    """Move a case to the next stage, or to stage_id when given"""
+    try:
+        if stage_id:
+            response = await write_case(case_id, "PUT", f"{case_path(case_id)}/stages/{quote(stage_id, safe='')}")
+        else:
+            response = await write_case(case_id, "POST", f"{case_path(case_id)}/stages/next")
+
+        if response.status_code in [200, 201]:
+            target = f"stage {stage_id}" if stage_id else "the next stage"
+            output = _write_result(f"Case {case_id} moved to {target}", response)
+        else:
+            output = format_error(f"Failed to change stage with status code {response.status_code}", response)
+
+        return output
+
+    except httpx.ConnectError as e:
+        error_msg = f"Connection error to Pega Platform: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+    except httpx.TimeoutException as e:
+        error_msg = f"Timeout connecting to Pega Platform after {config.TIMEOUT}s"
+        logger.error(error_msg)
+        return error_msg
+    except Exception as e:
+        error_msg = f"Error changing case stage: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+# ============================================================================
+# Create and Advance
+# ============================================================================
+
+STEP_TYPES = ("assignment", "case_action", "stage")
+
+def _check_steps(steps: List[Dict[str, Any]]) -> Optional[str]:
+    """Validate a step list up front, so a bad step never leaves a half-advanced case"""
+    for i, step in enumerate(steps, 1):
+        if step.get("type") not in STEP_TYPES:
+            return f"Step {i}: type must be one of {', '.join(STEP_TYPES)}"
+        if step["type"] == "case_action" and not step.get("action"):
+            return f"Step {i}: case_action needs an action"
+    return None
+
+def _next_assignment(data: Dict[str, Any]) -> Dict[str, Any]:
+    """The assignment a write response points at - nextAssignmentInfo, else the case's first"""
+    assignments = _case_info(data).get('assignments') or []
+    next_info = data.get('nextAssignmentInfo') or {}
+    for assignment in assignments:
+        if next_info.get('ID') and assignment.get('ID') == next_info['ID']:
+            return assignment
+    return assignments[0] if assignments else next_info
+
+async def _run_step(case_id: str, step: Dict[str, Any], last: Dict[str, Any]) -> Tuple[str, httpx.Response]:
+    """Send one step's write. Returns (description, response)"""
+    content = {"content": step.get("content") or {}}
+    if step["type"] == "case_action":
+        path = f"{case_path(case_id)}/actions/{quote(step['action'], safe='')}"
+        return f"action {step['action']}", await write_case(case_id, "PATCH", path, json=content)
+
+    if step["type"] == "stage":
+        stage_id = step.get("stage", "")
+        if stage_id and stage_id != "next":
+            return f"stage {stage_id}", await write_case(case_id, "PUT", f"{case_path(case_id)}/stages/{quote(stage_id, safe='')}")
+        return "next stage", await write_case(case_id, "POST", f"{case_path(case_id)}/stages/next")
+
+    assignment = _next_assignment(last)
+    actions = assignment.get('actions') or []
+    action_id = step.get("action") or (actions[0].get('ID', '') if actions else '')
+    if not assignment.get('ID') or not action_id:
+        raise ValueError("no open assignment" if not assignment.get('ID') else
+                         f"no action given or available for {assignment['ID']}")
+    # Assignment actions are locked on the case's eTag, which the previous step cached
+    path = f"/assignments/{quote(assignment['ID'], safe='')}/actions/{quote(action_id, safe='')}"
+    return f"{assignment.get('name') or assignment['ID']}: {action_id}", await write_case(case_id, "PATCH", path, json=content)
+
+def _step_failure(e: Exception) -> str:
+    """What went wrong with a step's request, worded like the other case tools' errors"""
+    if isinstance(e, httpx.ConnectError):
+        return f"Connection error to Pega Platform: {str(e)}"
+    if isinstance(e, httpx.TimeoutException):
+        return f"Timeout connecting to Pega Platform after {config.TIMEOUT}s"
+    return str(e)
+
+async def create_and_advance_case(case_type_id: str, content: Optional[Dict[str, Any]] = None,
+                                  steps: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Create a case and run a declared sequence of steps on it in one call.
+    
+    Each step is {"type": "assignment", "action": ..., "content": {...}} for
+    the current assignment (action defaults to its first one),
+    {"type": "case_action", "action": ..., "content": {...}} or
+    {"type": "stage", "stage": "next" or a stage ID}. With no steps, the
+    first assignment's first action is performed. Stops at the first failure
+    and reports the case ID, the steps completed and the step that failed.
+    """
+    steps = [{"type": "assignment"}] if steps is None else steps
+    error = _check_steps(steps)
+    if error:
+        return error
+
+    try:
+        start_time = time.perf_counter()
+        payload: Dict[str, Any] = {"caseTypeID": case_type_id}
+        if content:
+            payload["content"] = content
+        response = await pega_request("POST", "/cases", json=payload)
+        if response.status_code not in [200, 201]:
+            return format_error(f"Failed to create case with status code {response.status_code}", response)
+
+        last = response.json()
+        case_id = last.get('ID', last.get('id', '')) or _case_info(last).get('ID', '')
+        note_case_write(case_id, response)
+        lines = []
+        completed = 0
+
+        # From here on the case exists - a failing step ends the run, never the report
+        for i, step in enumerate(steps, 1):
+            try:
+                description, response = await _run_step(case_id, step, last)
+            except ValueError as e:
+                lines.append(f"  {i}. Stopped: {str(e)}")
+                break
+            except Exception as e:
+                lines.append(f"  {i}. {step['type']} step failed: {_step_failure(e)}")
+                logger.error(f"Step {i} on case {case_id} failed: {str(e)}")
+                break
+            if not 200 <= response.status_code < 300:
+                lines.append(f"  {i}. " + format_error(f"{description} failed with status code {response.status_code}", response))
+                break
+            completed += 1
+            lines.append(f"  {i}. {description}")
+            try:
+                last = response.json()
+            except ValueError:
+                # The step went through; only the case's new state is unknown
+                last = {}
+
+        case_info = _case_info(last)
+        elapsed = time.perf_counter() - start_time
+        output = f"Case {case_id} created, {completed} of {len(steps)} steps completed in {elapsed:.2f}s\n"
+        output += "".join(line + "\n" for line in lines)
+        output += f"Status: {case_info.get('status', 'Unknown')}"
+        if case_info.get('stageLabel'):
+            output += f", Stage: {case_info['stageLabel']}"
+        return output
+
+    except httpx.ConnectError as e:
+        error_msg = f"Connection error to Pega Platform: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+    except httpx.TimeoutException as e:
+        error_msg = f"Timeout connecting to Pega Platform after {config.TIMEOUT}s"
+        logger.error(error_msg)
+        return error_msg
+    except Exception as e:
+        error_msg = f"Error creating and advancing case: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
@@ -5,16 +5,20 @@ Tests all tools and resources individually with detailed output
 """
 
 import asyncio
+import json
 import sys
 import os
 from pathlib import Path
 
+import httpx
+
 # Add the current directory to Python path
 sys.path.insert(0, str(Path(__file__).parent))
 
 # Import the tools and resources
 from tools import verify_pega_connectivity, get_case_types, create_case, config
 from resources import get_case_types_resource, get_connection_status
+from payloads import INCREMENTAL, parse_fields, project, read_json, stream_json
 
 class TestResult:
     def __init__(self, name, success, message, details=None, raw_response=None):
@@ -264,6 +268,44 @@ async def test_connection_status_resource():
             f"Raw Exception: {str(e)}"
         )
 
+PROJECTION_SAMPLE = {
+    "data": {"caseInfo": {
+        "ID": "L-1", "status": "New",
+        "content": {"item": {"v": 1, "w": 2}, "tags": ["a", {"item": 3}], "rows": [[{"v": 4, "w": 5}]]},
+        "assignments": [{"ID": "A-1", "name": "Review"}, {"ID": "A-2", "item": {"v": 6}}]
+    }},
+    "uiResources": {"item": {"v": 7}}
+}
+
+async def test_payload_projection():
+    """Test that streaming and non-streaming field projection agree"""
+    print_test_header("Payload Projection")
+
+    body = json.dumps(PROJECTION_SAMPLE).encode()
+
+    async def chunks():
+        for i in range(0, len(body), 7):
+            yield body[i:i + 7]
+
+    mismatches = []
+    for fields in ["data.caseInfo.content.item.v", "data.caseInfo.content.tags", "data.caseInfo.assignments.ID",
+                   "data.caseInfo.assignments.item", "data.caseInfo.content.rows.v,data.caseInfo.status", "uiResources"]:
+        paths = parse_fields(fields)
+        expected = project(PROJECTION_SAMPLE, paths)
+        parsed = read_json(httpx.Response(200, content=body), paths)
+        streamed = await stream_json(httpx.Response(200, content=chunks()), paths)
+        if parsed != expected or streamed != expected:
+            mismatches.append(f"{fields}: expected {expected}, parsed {parsed}, streamed {streamed}")
+
+    mode = "incremental (ijson)" if INCREMENTAL else "json fallback"
+    return TestResult(
+        "Payload Projection",
+        not mismatches,
+        f"Projections {'differ' if mismatches else 'match'} ({mode})",
+        "\n".join(mismatches),
+        f"Raw Sample: {body.decode()}"
+    )
+
 async def run_all_tests():
     """Run all tests and return results"""
     print("Pega MCP Server - Comprehensive Test Suite")
@@ -275,7 +317,8 @@ async def run_all_tests():
         test_get_case_types,
         test_create_case,
         test_case_types_resource,
-        test_connection_status_resource
+        test_connection_status_resource,
+        test_payload_projection
     ]
     
     results = []
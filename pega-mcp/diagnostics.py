@@ -0,0 +1,224 @@
+"""
+Diagnostics - Slow-Call Flight Recorder and Sampling Profiler
+
+Every tool call carries a trace that the request path fills in by phase:
+auth wait, queueing for a request slot, connect, Pega server time (request
+sent to response headers), body transfer, parsing and retry backoff. What is
+left of the call's duration is our own work, reported as format. Calls at or
+above the slow-call threshold are kept in a ring buffer. Concurrent Pega
+calls within one tool call each add their time, so phases can sum to more
+than the total.
+
+The profiler samples the event loop thread's stack for a fixed time and
+ranks the functions it was in.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, Callable, Awaitable, Iterator
+
+from metrics import metrics
+
+PHASES = ("auth", "queue", "connect", "server", "transfer", "parse", "retry_wait", "format")
+
+# httpcore trace steps that open a connection
+CONNECT_STEPS = {"connect_tcp", "connect_unix_socket", "start_tls"}
+
+ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+ASYNCIO_EVENTS = os.path.join(ASYNCIO_DIR, "events.py")
+
+MAX_PROFILE_SECONDS = 60
+SAMPLE_INTERVAL = 0.005
+
+# ============================================================================
+# Call Traces
+# ============================================================================
+
+class CallTrace:
+    """Phase timings of one tool call"""
+
+    def __init__(self, tool: str):
+        self.tool = tool
+        self.started_at = time.time()
+        self.phases: Dict[str, float] = {}
+        self.pega_calls = 0
+        self.finished = False
+
+    def add(self, phase: str, ms: float) -> None:
+        # Background work started by the call (bulk jobs, coalesced leaders) outlives it
+        if not self.finished:
+            self.phases[phase] = self.phases.get(phase, 0.0) + ms
+
+_current_trace: ContextVar[Optional[CallTrace]] = ContextVar("call_trace", default=None)
+
+@contextmanager
+def trace_call(tool: str) -> Iterator[CallTrace]:
+    """Collect phase timings for the tool call running in this context"""
+    trace = CallTrace(tool)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.finished = True
+        _current_trace.reset(token)
+
+def add_phase(phase: str, ms: float) -> None:
+    """Add time to a phase of the current call, if one is being traced"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(phase, ms)
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time a block as a phase of the current call"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_phase(name, (time.perf_counter() - start_time) * 1000)
+
+def http_trace_hook() -> Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]]:
+    """httpx "trace" extension splitting one request into connect, server and transfer time"""
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    trace.pega_calls += 1
+    started: Dict[str, float] = {}
+
+    async def hook(event: str, info: Dict[str, Any]) -> None:
+        # Events look like "http11.send_request_headers.started"
+        step, _, state = event.rpartition(".")
+        name = step.split(".", 1)[-1]
+        now = time.perf_counter()
+        if state == "started":
+            started[name] = now
+            if name == "send_request_headers":
+                started["server"] = now
+            return
+        begin = started.pop(name, None)
+        if begin is None:
+            return
+        if name in CONNECT_STEPS:
+            trace.add("connect", (now - begin) * 1000)
+        elif name == "receive_response_headers":
+            trace.add("server", (now - started.pop("server", begin)) * 1000)
+        elif name == "receive_response_body":
+            trace.add("transfer", (now - begin) * 1000)
+
+    return hook
+
+# ============================================================================
+# Flight Recorder
+# ============================================================================
+
+class FlightRecorder:
+    """Ring buffer of the last slow tool calls with their phase breakdown"""
+
+    def __init__(self, size: int, threshold_ms: float):
+        self.threshold_ms = threshold_ms
+        self.entries: deque = deque(maxlen=max(size, 1))
+        self.recorded = 0
+
+    def record(self, trace: CallTrace, duration_ms: float, error: bool = False) -> None:
+        """Keep the call if it was slow"""
+        if duration_ms < self.threshold_ms:
+            return
+        phases = {p: max(trace.phases.get(p, 0.0), 0.0) for p in PHASES if p != "format"}
+        phases["format"] = max(duration_ms - sum(phases.values()), 0.0)
+        self.entries.append({
+            "tool": trace.tool,
+            "at": trace.started_at,
+            "ms": duration_ms,
+            "status": "error" if error else "ok",
+            "pega_calls": trace.pega_calls,
+            "phases": phases
+        })
+        self.recorded += 1
+        metrics.inc("mcp_slow_calls_total", {"tool": trace.tool})
+
+    def render(self) -> str:
+        """Newest first, one line of phases per call"""
+        if not self.entries:
+            return f"No tool calls at or above {self.threshold_ms:g}ms"
+        output = (f"Slow tool calls (>= {self.threshold_ms:g}ms, {len(self.entries)} kept of "
+                  f"{self.recorded} recorded, newest first):\n")
+        for entry in reversed(self.entries):
+            at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["at"]))
+            output += (f"- {at} {entry['tool']} {entry['ms']:.1f}ms {entry['status']}, "
+                       f"{entry['pega_calls']} Pega requests\n")
+            output += "    " + " | ".join(f"{p} {ms:.1f}" for p, ms in entry["phases"].items() if ms >= 0.05) + "\n"
+        return output
+
+# ============================================================================
+# Sampling Profiler
+# ============================================================================
+
+_profile_lock = threading.Lock()
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _is_loop_frame(frame) -> bool:
+    """asyncio's Handle._run, which every callback and task step runs under"""
+    return frame.f_code.co_name == "_run" and frame.f_code.co_filename == ASYNCIO_EVENTS
+
+def _sample_stacks(thread_id: int, seconds: float) -> Dict[str, Any]:
+    """Sample one thread's stack until the time is up (runs in a helper thread)"""
+    own = Counter()
+    inclusive = Counter()
+    samples = idle = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            samples += 1
+            own[_frame_label(frame)] += 1
+            # An event loop waiting in its selector has nothing to run
+            if os.path.basename(frame.f_code.co_filename) == "selectors.py":
+                idle += 1
+            else:
+                # Walk up to the callback the loop is running - frames below it say nothing
+                seen = set()
+                while frame is not None and not _is_loop_frame(frame):
+                    if not frame.f_code.co_filename.startswith(ASYNCIO_DIR):
+                        label = _frame_label(frame)
+                        if label not in seen:
+                            seen.add(label)
+                            inclusive[label] += 1
+                    frame = frame.f_back
+        time.sleep(SAMPLE_INTERVAL)
+    return {"samples": samples, "idle": idle, "own": own, "inclusive": inclusive}
+
+async def profile_event_loop(seconds: float = 5, top: int = 15) -> str:
+    """Sample the event loop thread for a few seconds and list its hottest functions"""
+    seconds = min(max(seconds, 0.1), MAX_PROFILE_SECONDS)
+    if not _profile_lock.acquire(blocking=False):
+        return "A profile is already running"
+    try:
+        result = await asyncio.to_thread(_sample_stacks, threading.get_ident(), seconds)
+    finally:
+        _profile_lock.release()
+
+    samples = result["samples"]
+    if not samples:
+        return "No samples collected"
+    busy = samples - result["idle"]
+    output = (f"Profiled the event loop for {seconds:g}s: {samples} samples, "
+              f"{busy / samples:.0%} busy, {result['idle'] / samples:.0%} idle in the selector\n")
+    output += f"\nTop {top} functions by own time (where the loop was when sampled):\n"
+    for label, n in result["own"].most_common(top):
+        output += f"  {n / samples:6.1%}  {label}\n"
+    if busy:
+        output += f"\nTop {top} functions by total time while busy (anywhere on the stack):\n"
+        for label, n in result["inclusive"].most_common(top):
+            output += f"  {n / busy:6.1%}  {label}\n"
+    return output
+
+metrics.describe("mcp_slow_calls_total", "Tool calls at or above the slow-call threshold")
@@ -0,0 +1,188 @@
+"""
+Case Hierarchy - Ancestor and Descendant Traversal
+
+Descendants are walked breadth-first. Each level is fetched concurrently and
+handed to the caller as soon as it is complete. Full descendant responses are
+never kept: each case's children are cached as a compact list of ID, name and
+status for HIERARCHY_CACHE_TTL seconds, in a cache bounded by
+HIERARCHY_CACHE_SIZE entries, and children Pega nested inline are detached as
+they are expanded. Besides that cache, a walk holds the levels it is working
+on and one ID per case visited.
+"""
+
+import asyncio
+import logging
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable, AsyncIterator
+
+import httpx
+from tools import config, ReferenceCache, pega_request, fetch_reference_json, format_error, case_path
+from payloads import read_json
+
+logger = logging.getLogger(__name__)
+
+# Short-lived, size-bounded cache of each case's ancestors and compact child lists
+hierarchy_cache = ReferenceCache("hierarchy", ttl=config.HIERARCHY_CACHE_TTL, max_entries=config.HIERARCHY_CACHE_SIZE)
+
+# Called with (cases found so far, formatted lines of the level just completed)
+LevelCallback = Callable[[int, str], Awaitable[None]]
+
+def _case_id(node: Dict[str, Any]) -> str:
+    return node.get('ID', node.get('id', ''))
+
+def _child_cases(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return data.get('childCases', data.get('descendants', [])) or []
+
+def _case_line(node: Dict[str, Any], depth: int, parent_id: str) -> str:
+    name = node.get('name', 'Unknown')
+    status = node.get('status', node.get('pyStatusWork', ''))
+    line = f"{'  ' * depth}- {_case_id(node)} {name}"
+    if status:
+        line += f" [{status}]"
+    return f"{line} (parent: {parent_id})"
+
+def _children_key(case_id: str) -> str:
+    return f"{case_path(case_id)}/children"
+
+def _compact(children: List[Dict[str, Any]]) -> List[List[str]]:
+    """What the walk needs of each child - ID, name and status - without the subtree Pega may nest in it"""
+    return [[_case_id(c), c.get('name', 'Unknown'), c.get('status', c.get('pyStatusWork', ''))] for c in children]
+
+async def _expand(node: Dict[str, Any], semaphore: asyncio.Semaphore) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Get a case's children - inline when Pega already nested them, else cached or fetched"""
+    case_id = _case_id(node)
+    if 'childCases' in node:
+        # Detach so the level being emitted does not keep the subtree below it alive
+        children = node.pop('childCases') or []
+    else:
+        entry = hierarchy_cache.get(_children_key(case_id))
+        if entry is not None and hierarchy_cache.is_fresh(entry):
+            return [{"ID": i, "name": name, "status": status} for i, name, status in entry["data"]], None
+        async with semaphore:
+            try:
+                response = await pega_request("GET", f"{case_path(case_id)}/descendants")
+                if response.status_code != 200:
+                    return [], format_error(f"{case_id}: status code {response.status_code}", response)
+                children = _child_cases(read_json(response))
+            except httpx.TimeoutException:
+                return [], f"{case_id}: timeout after {config.TIMEOUT}s"
+            except Exception as e:
+                return [], f"{case_id}: {str(e)}"
+    hierarchy_cache.put(_children_key(case_id), _compact(children), None)
+    return children, None
+
+async def walk_descendants(case_id: str, max_depth: int) -> AsyncIterator[Dict[str, Any]]:
+    """Yield {"depth", "nodes", "errors"} for each level below case_id.
+
+    Nodes are (case, parent ID) pairs. Every case is visited once, however
+    many parents reach it, so cycles end where they close.
+    """
+    semaphore = asyncio.Semaphore(config.HIERARCHY_CONCURRENCY)
+    visited = {case_id}
+    frontier: List[Dict[str, Any]] = [{"ID": case_id}]
+    depth = 0
+
+    while frontier and depth < max_depth:
+        results = await asyncio.gather(*(_expand(node, semaphore) for node in frontier))
+
+        next_level: List[Tuple[Dict[str, Any], str]] = []
+        errors = []
+        for parent, (children, error) in zip(frontier, results):
+            if error:
+                errors.append(error)
+            for child in children:
+                child_id = _case_id(child)
+                if child_id and child_id not in visited:
+                    visited.add(child_id)
+                    next_level.append((child, _case_id(parent)))
+
+        depth += 1
+        yield {"depth": depth, "nodes": next_level, "errors": errors}
+        frontier = [child for child, _ in next_level]
+
+async def get_case_descendants(case_id: str, max_depth: int = 10, on_level: Optional[LevelCallback] = None) -> str:
+    """Get the descendant case hierarchy.
+
+    Each level is passed to on_level as it completes; the returned summary
+    keeps at most MAX_OUTPUT_CHARS of case lines.
+    """
+    total = 0
+    levels = 0
+    lines: List[str] = []
+    chars = 0
+    truncated = False
+    errors: List[str] = []
+
+    try:
+        async for level in walk_descendants(case_id, max_depth):
+            # A failed root lookup means the case itself could not be read
+            if level["depth"] == 1 and level["errors"] and not level["nodes"]:
+                return f"Failed to get descendants of {case_id}: {level['errors'][0]}"
+
+            errors.extend(level["errors"])
+            if not level["nodes"]:
+                continue
+
+            levels = level["depth"]
+            total += len(level["nodes"])
+            level_lines = [_case_line(node, level["depth"], parent_id) for node, parent_id in level["nodes"]]
+            if on_level:
+                try:
+                    await on_level(total, "\n".join(level_lines))
+                except Exception as e:
+                    logger.debug(f"Hierarchy level report failed: {str(e)}")
+
+            for line in level_lines:
+                if chars + len(line) > config.MAX_OUTPUT_CHARS:
+                    truncated = True
+                    break
+                lines.append(line)
+                chars += len(line) + 1
+
+    except Exception as e:
+        error_msg = f"Error getting case descendants: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+    if total == 0 and not errors:
+        return f"Case {case_id} has no descendants"
+
+    output = f"Case {case_id} has {total} descendants across {levels} levels:\n"
+    output += "\n".join(lines) + "\n"
+    if truncated:
+        output += f"... ({total - len(lines)} more cases not shown)\n"
+    if errors:
+        output += f"Errors ({len(errors)}):\n" + "\n".join(f"  - {e}" for e in errors[:10]) + "\n"
+    return output
+
+async def get_case_ancestors(case_id: str) -> str:
+    """Get the ancestor case hierarchy"""
+    try:
+        data, response = await fetch_reference_json(f"{case_path(case_id)}/ancestors", cache=hierarchy_cache)
+
+        if data is not None:
+            ancestors = data.get('ancestors', [])
+
+            if ancestors:
+                output = f"Case {case_id} has {len(ancestors)} ancestors:\n"
+                for i, ancestor in enumerate(ancestors, 1):
+                    name = ancestor.get('name', 'Unknown')
+                    output += f"  {i}. {_case_id(ancestor)} {name}\n"
+            else:
+                output = f"Case {case_id} has no ancestors"
+        else:
+            output = format_error(f"Failed to get ancestors with status code {response.status_code}", response)
+
+        return output
+
+    except httpx.ConnectError as e:
+        error_msg = f"Connection error to Pega Platform: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+    except httpx.TimeoutException as e:
+        error_msg = f"Timeout connecting to Pega Platform after {config.TIMEOUT}s"
+        logger.error(error_msg)
+        return error_msg
+    except Exception as e:
+        error_msg = f"Error getting case ancestors: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
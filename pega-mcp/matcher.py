@@ -0,0 +1,129 @@
+"""
+Case Type Matcher - Ranked Lookup of Case Types by Phrase
+
+Case type names and IDs are indexed as word tokens and character trigrams
+(so "home loan" still finds UBANK-HOMELOAN-WORK), each weighted by how rare
+it is across case types. The index is rebuilt only when the cached case type
+list changes, and a lookup touches just the postings of the query's features.
+"""
+
+import re
+import math
+import time
+import logging
+from typing import Dict, Any, List, Tuple, Set
+
+import httpx
+from metrics import metrics
+from tools import config, current_target, fetch_reference_json, format_error
+
+logger = logging.getLogger(__name__)
+
+def _features(text: str) -> Set[str]:
+    """Word tokens plus trigrams of the text with separators removed"""
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    compact = "".join(words)
+    features = {f"w:{w}" for w in words}
+    features.update(compact[i:i + 3] for i in range(len(compact) - 2))
+    if 0 < len(compact) < 3:
+        features.add(compact)
+    return features
+
+class CaseTypeIndex:
+    """Inverted index from features to case types, with IDF weights"""
+
+    def __init__(self, case_types: List[Dict[str, Any]]):
+        self.case_types = case_types
+        self.postings: Dict[str, List[int]] = {}
+        for i, ct in enumerate(case_types):
+            text = f"{ct.get('name', '')} {ct.get('ID', ct.get('id', ''))}"
+            for feature in _features(text):
+                self.postings.setdefault(feature, []).append(i)
+
+        count = len(case_types)
+        self.weights = {f: math.log(1 + count / len(docs)) for f, docs in self.postings.items()}
+        self.norms = [0.0] * count
+        for feature, docs in self.postings.items():
+            for i in docs:
+                self.norms[i] += self.weights[feature]
+
+    def search(self, query: str, limit: int) -> List[Tuple[Dict[str, Any], float]]:
+        """Top case types by weighted feature overlap, scored 0-1"""
+        features = _features(query)
+        if not any(f in self.postings for f in features):
+            return []
+        # Query features no case type has count as the rarest kind, lowering every score
+        unseen = math.log(1 + len(self.case_types))
+        query_norm = sum(self.weights.get(f, unseen) for f in features)
+
+        overlap: Dict[int, float] = {}
+        for feature in features & self.postings.keys():
+            weight = self.weights[feature]
+            for i in self.postings[feature]:
+                overlap[i] = overlap.get(i, 0.0) + weight
+
+        scored = [(i, shared / math.sqrt(query_norm * self.norms[i])) for i, shared in overlap.items()]
+        scored.sort(key=lambda item: -item[1])
+        return [(self.case_types[i], score) for i, score in scored[:limit]]
+
+# Target name -> (case type data the index was built from, index)
+_indexes: Dict[str, Tuple[Any, CaseTypeIndex]] = {}
+
+def _index_for(data: Dict[str, Any]) -> CaseTypeIndex:
+    """The current target's index, rebuilt when the cached case type data was refreshed"""
+    name = current_target().name
+    built = _indexes.get(name)
+    # The cache hands back the same object until Pega returns a new list
+    if built is None or built[0] is not data:
+        start_time = time.perf_counter()
+        index = CaseTypeIndex(data.get('caseTypes', []))
+        _indexes[name] = (data, index)
+        metrics.inc("pega_case_type_index_builds_total", {"target": name})
+        logger.info(f"Indexed {len(index.case_types)} case types for {name} "
+                    f"in {(time.perf_counter() - start_time) * 1000:.2f}ms")
+        return index
+    return built[1]
+
+async def build_case_type_index() -> int:
+    """Fetch case types and index them ahead of the first lookup - returns the case type count"""
+    data, response = await fetch_reference_json("/casetypes")
+    if data is None:
+        raise Exception(f"Failed to get case types with status code {response.status_code}")
+    return len(_index_for(data).case_types)
+
+async def match_case_type(query: str, limit: int = 3) -> str:
+    """Rank case types against a phrase like "home loan" """
+    if not query.strip():
+        return "Provide a phrase to match against case types"
+    try:
+        data, response = await fetch_reference_json("/casetypes")
+        if data is None:
+            return format_error(f"Failed to get case types with status code {response.status_code}", response)
+
+        index = _index_for(data)
+        start_time = time.perf_counter()
+        matches = index.search(query, max(limit, 1))
+        metrics.observe("pega_case_type_match_duration_ms", None, (time.perf_counter() - start_time) * 1000)
+
+        if not matches:
+            return f"No case types match \"{query}\" ({len(index.case_types)} case types available)"
+        output = f"Top {len(matches)} case types for \"{query}\":\n"
+        for i, (ct, score) in enumerate(matches, 1):
+            output += f"  {i}. {ct.get('name', 'Unknown')} (ID: {ct.get('ID', ct.get('id', 'No ID'))}) - score {score:.2f}\n"
+        return output
+
+    except httpx.ConnectError as e:
+        error_msg = f"Connection error to Pega Platform: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+    except httpx.TimeoutException as e:
+        error_msg = f"Timeout connecting to Pega Platform after {config.TIMEOUT}s"
+        logger.error(error_msg)
+        return error_msg
+    except Exception as e:
+        error_msg = f"Error matching case types: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+metrics.describe("pega_case_type_match_duration_ms", "Case type index lookup time")
+metrics.describe("pega_case_type_index_builds_total", "Case type index rebuilds after the case type list changed")
@@ -0,0 +1,248 @@
+"""
+Metrics - Counters, Gauges and Latency Histograms
+
+A small in-process registry rendered two ways: a readable summary for the
+pega://metrics resource and Prometheus text format for the /metrics route.
+"""
+
+import re
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, List, Tuple, Callable, Iterator
+
+import httpx
+
+# Histogram bucket upper bounds in milliseconds
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Collectors return (name, labels, value, type) samples read at render time
+Sample = Tuple[str, Dict[str, str], float, str]
+Collector = Callable[[], List[Sample]]
+
+def _labels(labels: Optional[Dict[str, str]]) -> Labels:
+    return tuple(sorted((labels or {}).items()))
+
+def _escape(value: Any) -> str:
+    """Label value escaping of the text exposition format"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+    return "{" + inner + "}"
+
+class Histogram:
+    """Cumulative latency histogram"""
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value_ms: float) -> None:
+        self.count += 1
+        self.sum += value_ms
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if value_ms <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def quantile(self, q: float) -> float:
+        """Approximate quantile - the upper bound of the bucket holding it"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS_MS, self.bucket_counts):
+            seen += n
+            if seen >= rank:
+                return float(bound)
+        return float("inf")
+
+class MetricsRegistry:
+    """Process-wide metrics store"""
+
+    def __init__(self):
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.gauges: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.help: Dict[str, str] = {}
+        self._collectors: List[Collector] = []
+
+    def describe(self, name: str, text: str) -> None:
+        self.help[name] = text
+
+    def inc(self, name: str, labels: Optional[Dict[str, str]] = None, value: float = 1) -> None:
+        series = self.counters.setdefault(name, {})
+        key = _labels(labels)
+        series[key] = series.get(key, 0) + value
+
+    def add_gauge(self, name: str, labels: Optional[Dict[str, str]] = None, value: float = 1) -> None:
+        series = self.gauges.setdefault(name, {})
+        key = _labels(labels)
+        series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, labels: Optional[Dict[str, str]] = None, value: float = 0) -> None:
+        self.gauges.setdefault(name, {})[_labels(labels)] = value
+
+    def observe(self, name: str, labels: Optional[Dict[str, str]], value_ms: float) -> None:
+        series = self.histograms.setdefault(name, {})
+        key = _labels(labels)
+        if key not in series:
+            series[key] = Histogram()
+        series[key].observe(value_ms)
+
+    def register_collector(self, collector: Collector) -> None:
+        self._collectors.append(collector)
+
+    @contextmanager
+    def track(self, prefix: str, labels: Dict[str, str]) -> Iterator[None]:
+        """Time a block: <prefix>_duration_ms, <prefix>_in_flight and <prefix>_total{outcome}"""
+        self.add_gauge(f"{prefix}_in_flight", labels, 1)
+        start_time = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            self.add_gauge(f"{prefix}_in_flight", labels, -1)
+            self.observe(f"{prefix}_duration_ms", labels, (time.perf_counter() - start_time) * 1000)
+            self.inc(f"{prefix}_total", {**labels, "outcome": outcome})
+
+    def _collected(self) -> List[Sample]:
+        samples: List[Sample] = []
+        for collector in self._collectors:
+            try:
+                samples.extend(collector())
+            except Exception:
+                pass
+        return samples
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format - every family written as one contiguous group"""
+        # Family name -> (type, sample lines), collected samples merged into their family
+        families: Dict[str, Tuple[str, List[str]]] = {}
+
+        def family(name: str, kind: str) -> List[str]:
+            return families.setdefault(name, (kind, []))[1]
+
+        for name, series in sorted(self.counters.items()):
+            samples = family(name, "counter")
+            for labels, value in series.items():
+                samples.append(f"{name}{_format_labels(labels)} {value}")
+        for name, series in sorted(self.gauges.items()):
+            samples = family(name, "gauge")
+            for labels, value in series.items():
+                samples.append(f"{name}{_format_labels(labels)} {value}")
+        for name, series in sorted(self.histograms.items()):
+            samples = family(name, "histogram")
+            for labels, hist in series.items():
+                cumulative = 0
+                for bound, n in zip(LATENCY_BUCKETS_MS, hist.bucket_counts):
+                    cumulative += n
+                    samples.append(f"{name}_bucket{_format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                samples.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {hist.count}")
+                samples.append(f"{name}_sum{_format_labels(labels)} {hist.sum}")
+                samples.append(f"{name}_count{_format_labels(labels)} {hist.count}")
+        for name, labels, value, kind in self._collected():
+            family(name, kind).append(f"{name}{_format_labels(_labels(labels))} {value}")
+
+        lines: List[str] = []
+        for name, (kind, samples) in families.items():
+            if name in self.help:
+                lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def render_text(self) -> str:
+        """Readable summary for the pega://metrics resource"""
+        output = "Pega MCP Server Metrics\n"
+
+        for name, series in sorted(self.histograms.items()):
+            output += f"\n{name}:\n"
+            for labels, hist in sorted(series.items(), key=lambda item: -item[1].sum):
+                label = " ".join(v for _, v in labels)
+                avg = hist.sum / hist.count if hist.count else 0.0
+                output += (f"  {label}: {hist.count} calls, avg {avg:.1f}ms, "
+                           f"p50 <={hist.quantile(0.5):.0f}ms, p95 <={hist.quantile(0.95):.0f}ms, "
+                           f"p99 <={hist.quantile(0.99):.0f}ms\n")
+
+        for name, series in sorted({**self.counters, **self.gauges}.items()):
+            if name.endswith("_total") and name.replace("_total", "_duration_ms") in self.histograms:
+                # Outcome counts are only listed when something failed
+                series = {k: v for k, v in series.items() if ("outcome", "error") in k}
+                if not series:
+                    continue
+            output += f"\n{name}:\n"
+            for labels, value in sorted(series.items()):
+                label = " ".join(f"{k}={v}" for k, v in labels) or "value"
+                output += f"  {label}: {value:g}\n"
+
+        collected = self._collected()
+        if collected:
+            output += "\nCollected:\n"
+            for name, labels, value, _ in collected:
+                label = " ".join(f"{k}={v}" for k, v in sorted(labels.items()))
+                output += f"  {name} {label}: {value:g}\n" if label else f"  {name}: {value:g}\n"
+
+        return output
+
+metrics = MetricsRegistry()
+
+# ============================================================================
+# Outbound HTTP Instrumentation
+# ============================================================================
+
+# Path segments kept as-is when labelling Pega endpoints - anything else is an ID
+_LITERAL_SEGMENTS = {
+    "cases", "casetypes", "actions", "assignments", "next", "attachments", "upload",
+    "attachment_categories", "documents", "descendants", "ancestors", "stages", "views",
+    "refresh", "save", "calculated_fields", "processes", "updates", "participants",
+    "participant_roles", "followers", "tags", "related_cases", "navigation_steps",
+    "previous", "bulk-actions", "data_views", "data"
+}
+
+def endpoint_label(method: str, path: str, api_prefix: str) -> str:
+    """Collapse a request path to a low-cardinality endpoint name, e.g. GET /cases/{id}"""
+    if path.startswith(api_prefix):
+        path = path[len(api_prefix):]
+    elif "oauth2" in path:
+        return f"{method} /oauth2/token"
+    segments = [s if s in _LITERAL_SEGMENTS else "{id}" for s in path.strip("/").split("/") if s]
+    return f"{method} /" + "/".join(segments)
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Wraps the pool's transport to time every outbound Pega request"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, api_prefix: str):
+        self._transport = transport
+        self._api_prefix = re.sub(r"^https?://[^/]+", "", api_prefix)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        labels = {"endpoint": endpoint_label(request.method, request.url.path, self._api_prefix)}
+        metrics.add_gauge("pega_requests_in_flight", labels, 1)
+        start_time = time.perf_counter()
+        status = "error"
+        try:
+            response = await self._transport.handle_async_request(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            metrics.add_gauge("pega_requests_in_flight", labels, -1)
+            metrics.observe("pega_request_duration_ms", labels, (time.perf_counter() - start_time) * 1000)
+            metrics.inc("pega_responses_total", {**labels, "status": status})
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+metrics.describe("pega_request_duration_ms", "Time to response headers for outbound Pega requests")
+metrics.describe("pega_responses_total", "Outbound Pega responses by endpoint and status code")
+metrics.describe("pega_requests_in_flight", "Outbound Pega requests awaiting a response")
+metrics.describe("mcp_tool_duration_ms", "MCP tool call latency")
+metrics.describe("mcp_resource_duration_ms", "MCP resource read latency")
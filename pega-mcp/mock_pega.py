@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Mock Pega DX v2 Server - Local stand-in for benchmarks and offline testing
+
+Implements the DX endpoints used by tools.py and resources.py, plus OAuth
+token issuance, with configurable token expiry, latency and error rate.
+
+Usage: python mock_pega.py --port 8090 --latency-ms 50 --error-rate 0.01
+Then point the MCP server at it: PEGA_BASE_URL=http://localhost:8090
+"""
+
+import time
+import uuid
+import base64
+import random
+import asyncio
+import argparse
+import logging
+from typing import Dict, Any, Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route, Mount
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# Mock Settings and State
+# ============================================================================
+
+class MockSettings:
+    """Behaviour knobs, set from the command line"""
+    token_expiry = 3600
+    latency_ms = 0.0
+    jitter_ms = 0.0
+    error_rate = 0.0
+    error_status = 500
+    hierarchy_depth = 3
+    hierarchy_width = 3
+    document_size = 1024 * 1024
+    ui_fields = 200
+
+settings = MockSettings()
+
+CASE_TYPES = [
+    {"ID": "UBANK-HOMELOAN-WORK", "name": "Home Loan"},
+    {"ID": "UBANK-UNSECUREDLOAN-WORK", "name": "Unsecured Loan"},
+    {"ID": "UBANK-SECUREDLOAN-WORK", "name": "Secured Loan"},
+    {"ID": "UBANK-CREDITCARD-WORK", "name": "Credit Card Application"}
+]
+CASE_TYPES_ETAG = '"casetypes-1"'
+
+_tokens: Dict[str, float] = {}
+_case_counter = 0
+# Case ID -> caseInfo, with the version used as its eTag
+_cases: Dict[str, Dict[str, Any]] = {}
+STAGES = ["Intake", "Review", "Approval", "Resolution"]
+# Assignment ID -> {"case_id", "locked"}, in queue order
+_worklist: Dict[str, Dict[str, Any]] = {}
+stats: Dict[str, Any] = {"tokens_issued": 0, "requests": 0, "errors": 0, "unauthorized": 0, "by_route": {}}
+
+# ============================================================================
+# Helpers
+# ============================================================================
+
+async def _simulate(request: Request, route: str) -> Optional[Response]:
+    """Apply latency, count the request and maybe inject an error"""
+    stats["requests"] += 1
+    stats["by_route"][route] = stats["by_route"].get(route, 0) + 1
+
+    delay = settings.latency_ms + random.uniform(-settings.jitter_ms, settings.jitter_ms)
+    if delay > 0:
+        await asyncio.sleep(delay / 1000)
+
+    if settings.error_rate and random.random() < settings.error_rate:
+        stats["errors"] += 1
+        headers = {"Retry-After": "1"} if settings.error_status == 429 else None
+        return JSONResponse({"error": "Injected mock error"}, status_code=settings.error_status, headers=headers)
+    return None
+
+def _authorized(request: Request) -> bool:
+    auth = request.headers.get("authorization", "")
+    token = auth[7:] if auth.startswith("Bearer ") else ""
+    expires_at = _tokens.get(token)
+    if expires_at is None or time.time() >= expires_at:
+        stats["unauthorized"] += 1
+        return False
+    return True
+
+def api(route: str):
+    """Decorate a DX endpoint with simulation and bearer-token checks"""
+    def wrap(handler):
+        async def endpoint(request: Request) -> Response:
+            if not _authorized(request):
+                return JSONResponse({"error": "invalid_token"}, status_code=401)
+            error = await _simulate(request, route)
+            if error is not None:
+                return error
+            return await handler(request)
+        return endpoint
+    return wrap
+
+# ============================================================================
+# OAuth
+# ============================================================================
+
+async def issue_token(request: Request) -> Response:
+    error = await _simulate(request, "POST /token")
+    if error is not None:
+        return error
+
+    form = await request.form()
+    if form.get("grant_type") != "client_credentials" or not form.get("client_id"):
+        return JSONResponse({"error": "invalid_request", "error_description": "client credentials required"}, status_code=400)
+
+    token = uuid.uuid4().hex
+    _tokens[token] = time.time() + settings.token_expiry
+    stats["tokens_issued"] += 1
+    return JSONResponse({"access_token": token, "token_type": "bearer", "expires_in": settings.token_expiry})
+
+# ============================================================================
+# DX Endpoints
+# ============================================================================
+
+@api("GET /casetypes")
+async def get_casetypes(request: Request) -> Response:
+    if request.headers.get("if-none-match") == CASE_TYPES_ETAG:
+        return Response(status_code=304, headers={"ETag": CASE_TYPES_ETAG})
+    return JSONResponse({"caseTypes": CASE_TYPES}, headers={"ETag": CASE_TYPES_ETAG})
+
+@api("GET /casetypes/{id}/actions/{action}")
+async def get_casetype_action(request: Request) -> Response:
+    action_id = request.path_params["action_id"]
+    return JSONResponse({"data": {"ID": action_id, "name": action_id, "caseTypeID": request.path_params["case_type_id"]}})
+
+@api("POST /cases")
+async def create_case(request: Request) -> Response:
+    body = await request.json()
+    if not any(ct["ID"] == body.get("caseTypeID") for ct in CASE_TYPES):
+        return JSONResponse({"error": f"Unknown case type {body.get('caseTypeID')}"}, status_code=400)
+    return _case_response(_new_case(body["caseTypeID"]), status_code=201)
+
+def _ui_resources(view_id: str) -> Dict[str, Any]:
+    """UI metadata of roughly settings.ui_fields fields, like the uiResources Pega sends with a case"""
+    fields = [{"type": "TextInput", "config": {"value": f"@P .Field{i}", "label": f"@L Field {i}",
+                                               "helperText": "", "displayMode": "", "validatemessage": ""}}
+              for i in range(settings.ui_fields)]
+    return {
+        "root": {"type": "reference", "config": {"name": view_id, "type": "view"}},
+        "resources": {"views": {view_id: [{"name": view_id, "type": "View", "config": {"template": "DefaultForm"},
+                                           "children": [{"type": "Region", "children": fields}]}]},
+                      "fields": {f"Field{i}": [{"type": "Text", "label": f"Field {i}", "maxLength": 256}]
+                                 for i in range(settings.ui_fields)}}
+    }
+
+def _case_response(case_id: str, status_code: int = 200) -> Response:
+    case_info = _cases[case_id]
+    body = {"ID": case_id, "data": {"caseInfo": case_info}, "uiResources": _ui_resources("pyDetails")}
+    return JSONResponse(body, status_code=status_code, headers={"ETag": f'"{case_info["version"]}"'})
+
+def _case_write(request: Request) -> Optional[Response]:
+    """Check the case exists and If-Match carries its current eTag"""
+    case_id = request.path_params["case_id"]
+    if case_id not in _cases:
+        return JSONResponse({"error": f"Case {case_id} not found"}, status_code=404)
+    if request.headers.get("if-match") != f'"{_cases[case_id]["version"]}"':
+        return JSONResponse({"error": "eTag mismatch"}, status_code=412)
+    return None
+
+def _case_updated(case_id: str) -> Response:
+    case_info = _cases[case_id]
+    case_info["version"] += 1
+    case_info["lastUpdateTime"] = time.strftime("%Y%m%dT%H%M%S GMT", time.gmtime())
+    return _case_response(case_id)
+
+@api("GET /cases/{id}")
+async def get_case(request: Request) -> Response:
+    case_id = request.path_params["case_id"]
+    if case_id not in _cases:
+        return JSONResponse({"error": f"Case {case_id} not found"}, status_code=404)
+    if request.headers.get("if-none-match") == f'"{_cases[case_id]["version"]}"':
+        return Response(status_code=304, headers={"ETag": f'"{_cases[case_id]["version"]}"'})
+    return _case_response(case_id)
+
+@api("GET /cases/{id}/views/{view}")
+async def get_case_view(request: Request) -> Response:
+    case_id = request.path_params["case_id"]
+    if case_id not in _cases:
+        return JSONResponse({"error": f"Case {case_id} not found"}, status_code=404)
+    case_info = dict(_cases[case_id], content={f"Field{i}": f"value {i}" for i in range(settings.ui_fields)})
+    body = {"data": {"caseInfo": case_info}, "uiResources": _ui_resources(request.path_params["view_id"])}
+    return JSONResponse(body, headers={"ETag": f'"{case_info["version"]}"'})
+
+@api("PATCH /cases/{id}/actions/{action}")
+async def case_action(request: Request) -> Response:
+    error = _case_write(request)
+    if error is not None:
+        return error
+    case_id = request.path_params["case_id"]
+    _cases[case_id]["status"] = "Open"
+    return _case_updated(case_id)
+
+@api("POST /cases/{id}/stages/next")
+async def next_stage(request: Request) -> Response:
+    error = _case_write(request)
+    if error is not None:
+        return error
+    case_info = _cases[request.path_params["case_id"]]
+    index = min(STAGES.index(case_info["stageID"]) + 1, len(STAGES) - 1)
+    case_info["stageID"] = case_info["stageLabel"] = STAGES[index]
+    return _case_updated(case_info["ID"])
+
+@api("PUT /cases/{id}/stages/{stage}")
+async def change_stage(request: Request) -> Response:
+    error = _case_write(request)
+    if error is not None:
+        return error
+    stage_id = request.path_params["stage_id"]
+    if stage_id not in STAGES:
+        return JSONResponse({"error": f"Unknown stage {stage_id}"}, status_code=400)
+    case_info = _cases[request.path_params["case_id"]]
+    case_info["stageID"] = case_info["stageLabel"] = stage_id
+    return _case_updated(case_info["ID"])
+
+@api("PATCH /cases")
+async def bulk_action(request: Request) -> Response:
+    body = await request.json()
+    return JSONResponse({"cases": [{"ID": c.get("ID"), "status": 200} for c in body.get("cases", [])]}, status_code=207)
+
+@api("POST /cases/bulk-actions")
+async def get_bulk_actions(request: Request) -> Response:
+    return JSONResponse({"actions": [{"ID": "pyWithdraw", "name": "Withdraw"}, {"ID": "pyChangeStage", "name": "Change stage"}]})
+
+def _new_case(case_type_id: str) -> str:
+    global _case_counter
+    _case_counter += 1
+    case_id = f"L-{_case_counter}"
+    now = time.strftime("%Y%m%dT%H%M%S GMT", time.gmtime())
+    _cases[case_id] = {
+        "ID": case_id, "name": "Mock case", "caseTypeID": case_type_id, "status": "New",
+        "stageID": STAGES[0], "stageLabel": STAGES[0], "urgency": "10", "createTime": now,
+        "createdBy": "mock", "lastUpdateTime": now, "lastUpdatedBy": "mock", "version": 1,
+        "assignments": [{"ID": f"ASSIGN-WORKLIST {case_id}!FLOW", "name": "Review",
+                         "actions": [{"ID": "Submit", "name": "Submit"}]}]
+    }
+    return case_id
+
+@api("GET /assignments/next")
+async def get_next_assignment(request: Request) -> Response:
+    # Like Get Next Work, the assignment handed out is locked until it is performed
+    for assignment_id, entry in _worklist.items():
+        if not entry["locked"]:
+            entry["locked"] = True
+            case_info = dict(_cases[entry["case_id"]])
+            case_info["assignments"] = [{"ID": assignment_id, "name": "Review",
+                                         "actions": [{"ID": "Approve", "name": "Approve"}]}]
+            return JSONResponse({"data": {"caseInfo": case_info}})
+    return JSONResponse({"error": "No assignments available"}, status_code=404)
+
+def _assignment_case(assignment_id: str) -> Optional[str]:
+    """Case holding an assignment - queued on the worklist or still open on the case"""
+    if assignment_id in _worklist:
+        return _worklist[assignment_id]["case_id"]
+    for case_id, case_info in _cases.items():
+        if any(a["ID"] == assignment_id for a in case_info.get("assignments", [])):
+            return case_id
+    return None
+
+@api("GET /assignments/{id}/actions/{action}")
+async def get_assignment_action(request: Request) -> Response:
+    case_id = _assignment_case(request.path_params["assignment_id"])
+    if case_id is None:
+        return JSONResponse({"error": "Assignment not found"}, status_code=404)
+    case_info = _cases[case_id]
+    return JSONResponse({"data": {"caseInfo": case_info}, "uiResources": {"root": {"type": "reference"}}},
+                        headers={"ETag": f'"{case_info["version"]}"'})
+
+@api("PATCH /assignments/{id}/actions/{action}")
+async def perform_assignment_action(request: Request) -> Response:
+    assignment_id = request.path_params["assignment_id"]
+    case_id = _assignment_case(assignment_id)
+    if case_id is None:
+        return JSONResponse({"error": "Assignment not found"}, status_code=404)
+    case_info = _cases[case_id]
+    if request.headers.get("if-match") != f'"{case_info["version"]}"':
+        return JSONResponse({"error": "eTag mismatch"}, status_code=412)
+    _worklist.pop(assignment_id, None)
+    case_info["assignments"] = [a for a in case_info["assignments"] if a["ID"] != assignment_id]
+    case_info["status"] = "Resolved-Completed"
+    return _case_updated(case_id)
+
+@api("GET /cases/{id}/descendants")
+async def get_descendants(request: Request) -> Response:
+    case_id = request.path_params["case_id"]
+    depth = case_id.count(".")
+    if depth >= settings.hierarchy_depth:
+        return JSONResponse({"childCases": []})
+    children = [{"ID": f"{case_id}.{i}", "name": f"Subcase {i}", "status": "Open"} for i in range(settings.hierarchy_width)]
+    return JSONResponse({"childCases": children})
+
+@api("GET /cases/{id}/ancestors")
+async def get_ancestors(request: Request) -> Response:
+    parts = request.path_params["case_id"].split(".")
+    ancestors = [{"ID": ".".join(parts[:i]), "name": "Parent case"} for i in range(len(parts) - 1, 0, -1)]
+    return JSONResponse({"ancestors": ancestors})
+
+@api("POST /attachments/upload")
+async def upload_attachment(request: Request) -> Response:
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+    return JSONResponse({"ID": uuid.uuid4().hex, "size": size}, status_code=201)
+
+def _reference(request: Request, body: Dict[str, Any], etag: str) -> Response:
+    """Slow-changing reference data with a fixed ETag"""
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(body, headers={"ETag": etag})
+
+@api("GET /cases/{id}/participant_roles")
+async def get_participant_roles(request: Request) -> Response:
+    return _reference(request, {"participantRoles": [{"ID": "Owner", "name": "Owner"}, {"ID": "Customer", "name": "Customer"},
+                                                     {"ID": "Approver", "name": "Approver"}]}, '"roles-1"')
+
+@api("GET /cases/{id}/attachment_categories")
+async def get_attachment_categories(request: Request) -> Response:
+    return _reference(request, {"attachment_categories": [{"ID": "File", "name": "File"},
+                                                          {"ID": "Correspondence", "name": "Correspondence"}]},
+                      '"categories-1"')
+
+@api("POST /cases/{id}/attachments")
+async def add_attachments(request: Request) -> Response:
+    return JSONResponse({}, status_code=201)
+
+@api("GET /attachments/{id}")
+async def get_attachment(request: Request) -> Response:
+    content = base64.b64encode(b"mock attachment " + request.path_params["attachment_id"].encode())
+    return Response(content, headers={"Content-Transfer-Encoding": "base64"})
+
+@api("GET /documents/{id}")
+async def get_document(request: Request) -> Response:
+    return Response(b"\0" * settings.document_size, media_type="application/pdf")
+
+# ============================================================================
+# Mock Control
+# ============================================================================
+
+async def get_stats(request: Request) -> Response:
+    return JSONResponse(stats)
+
+async def reset_stats(request: Request) -> Response:
+    stats.update({"tokens_issued": 0, "requests": 0, "errors": 0, "unauthorized": 0, "by_route": {}})
+    return JSONResponse(stats)
+
+async def seed_worklist(request: Request) -> Response:
+    """Queue ?size=N new assignments for GET /assignments/next"""
+    size = int(request.query_params.get("size", "100"))
+    for _ in range(size):
+        case_id = _new_case(CASE_TYPES[0]["ID"])
+        _worklist[f"ASSIGN-WORKLIST {case_id}!FLOW"] = {"case_id": case_id, "locked": False}
+    return JSONResponse({"queued": len(_worklist)})
+
+dx_routes = [
+    Route("/casetypes", get_casetypes, methods=["GET"]),
+    Route("/casetypes/{case_type_id}/actions/{action_id}", get_casetype_action, methods=["GET"]),
+    Route("/cases", create_case, methods=["POST"]),
+    Route("/cases", bulk_action, methods=["PATCH"]),
+    Route("/cases/bulk-actions", get_bulk_actions, methods=["POST"]),
+    Route("/cases/{case_id}", get_case, methods=["GET"]),
+    Route("/cases/{case_id}/views/{view_id}", get_case_view, methods=["GET"]),
+    Route("/cases/{case_id}/actions/{action_id}", case_action, methods=["PATCH"]),
+    Route("/cases/{case_id}/stages/next", next_stage, methods=["POST"]),
+    Route("/cases/{case_id}/stages/{stage_id}", change_stage, methods=["PUT"]),
+    Route("/assignments/next", get_next_assignment, methods=["GET"]),
+    Route("/assignments/{assignment_id}/actions/{action_id}", get_assignment_action, methods=["GET"]),
+    Route("/assignments/{assignment_id}/actions/{action_id}", perform_assignment_action, methods=["PATCH"]),
+    Route("/cases/{case_id}/descendants", get_descendants, methods=["GET"]),
+    Route("/cases/{case_id}/ancestors", get_ancestors, methods=["GET"]),
+    Route("/cases/{case_id}/attachments", add_attachments, methods=["POST"]),
+    Route("/cases/{case_id}/participant_roles", get_participant_roles, methods=["GET"]),
+    Route("/cases/{case_id}/attachment_categories", get_attachment_categories, methods=["GET"]),
+    Route("/attachments/upload", upload_attachment, methods=["POST"]),
+    Route("/attachments/{attachment_id}", get_attachment, methods=["GET"]),
+    Route("/documents/{document_id}", get_document, methods=["GET"])
+]
+
+app = Starlette(routes=[
+    Route("/prweb/PRRestService/oauth2/v1/token", issue_token, methods=["POST"]),
+    Mount("/prweb/app/{app_alias}/api/application/v2", routes=dx_routes),
+    Route("/mock/stats", get_stats, methods=["GET"]),
+    Route("/mock/reset", reset_stats, methods=["POST"]),
+    Route("/mock/worklist", seed_worklist, methods=["POST"])
+], middleware=[Middleware(GZipMiddleware, minimum_size=1024)])
+
+# ============================================================================
+# Main
+# ============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Pega DX v2 server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--token-expiry", type=int, default=3600, help="Token lifetime in seconds")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random +/- latency per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail (0-1)")
+    parser.add_argument("--error-status", type=int, default=500, help="Status code of injected errors")
+    parser.add_argument("--ui-fields", type=int, default=200, help="Fields in the UI metadata sent with cases and views")
+    args = parser.parse_args()
+
+    settings.token_expiry = args.token_expiry
+    settings.latency_ms = args.latency_ms
+    settings.jitter_ms = args.jitter_ms
+    settings.error_rate = args.error_rate
+    settings.error_status = args.error_status
+    settings.ui_fields = args.ui_fields
+
+    logger.info(f"Starting mock Pega server on http://{args.host}:{args.port}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,152 @@
+"""
+Payload Projection - Keep Only the Requested Fields of Large Responses
+
+Case and view responses carry large nested UI metadata. Given a list of
+dotted paths (e.g. "data.caseInfo.status"), only those paths and the
+containers leading to them are built; with the optional ijson package the
+body is parsed incrementally, so the rest is never materialized. List items
+are transparent in paths: "data.caseInfo.assignments.ID" keeps the ID of
+every assignment.
+"""
+
+import io
+import json
+import time
+import logging
+from typing import Any, List, Tuple, Optional, Sequence, AsyncIterator
+
+import httpx
+from metrics import metrics
+from diagnostics import phase, add_phase
+
+logger = logging.getLogger(__name__)
+
+Path = Tuple[str, ...]
+
+def _ijson_available() -> bool:
+    """Incremental parsing needs the optional ijson package"""
+    try:
+        import ijson  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+INCREMENTAL = _ijson_available()
+
+def parse_fields(fields: Sequence[str]) -> List[Path]:
+    """["data.caseInfo.status", ...] or one comma-separated string -> path tuples"""
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    return [tuple(f.strip().split(".")) for f in fields if f.strip()]
+
+def _relevant(path: Path, paths: List[Path]) -> bool:
+    """True when path leads to, or lies inside, a requested path"""
+    return any(p[:len(path)] == path or path[:len(p)] == p for p in paths)
+
+def project(value: Any, paths: List[Path], prefix: Path = ()) -> Any:
+    """Project an already parsed object"""
+    if any(prefix[:len(p)] == p for p in paths):
+        return value
+    if isinstance(value, dict):
+        return {k: project(v, paths, prefix + (k,)) for k, v in value.items() if _relevant(prefix + (k,), paths)}
+    if isinstance(value, list):
+        return [project(item, paths, prefix) for item in value]
+    return value
+
+class _EventFilter:
+    """Decides which parser events to keep by tracking the key path of each event.
+
+    List items add no key to the path, so a real key named "item" - which
+    ijson's own prefixes could not tell apart from a list item - is kept.
+    """
+
+    _ITEM = object()
+
+    def __init__(self, paths: List[Path]):
+        self.paths = paths
+        self.frames: List[Any] = []  # per open container: its current key, or _ITEM for a list
+
+    def wanted(self, event: str, value: Any) -> bool:
+        if event in ("end_map", "end_array"):
+            self.frames.pop()
+        elif event == "map_key":
+            self.frames[-1] = value
+        keep = _relevant(tuple(k for k in self.frames if k is not self._ITEM), self.paths)
+        if event == "start_map":
+            self.frames.append(None)
+        elif event == "start_array":
+            self.frames.append(self._ITEM)
+        return keep
+
+def _count_bytes(response: httpx.Response, decoded: int) -> None:
+    metrics.inc("pega_response_bytes_total", {"kind": "wire"}, response.num_bytes_downloaded)
+    metrics.inc("pega_response_bytes_total", {"kind": "decoded"}, decoded)
+
+def read_json(response: httpx.Response, fields: Optional[List[Path]] = None) -> Any:
+    """Parse a read response body, keeping only fields when given"""
+    _count_bytes(response, len(response.content))
+    with phase("parse"):
+        if not fields:
+            return response.json()
+        if not INCREMENTAL:
+            return project(response.json(), fields)
+        import ijson
+        builder = ijson.ObjectBuilder()
+        events = _EventFilter(fields)
+        for event, value in ijson.basic_parse(io.BytesIO(response.content), use_float=True):
+            if events.wanted(event, value):
+                builder.event(event, value)
+        return getattr(builder, "value", None)
+
+class _AsyncBody:
+    """File-like view of a streamed response body for ijson"""
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks
+        self.size = 0
+        self.wait_ms = 0.0
+
+    async def read(self, size: int = -1) -> bytes:
+        if size == 0:
+            # ijson probes with read(0) to tell bytes from str
+            return b""
+        # An empty read means end of body to ijson, so skip empty decoder output
+        start_time = time.perf_counter()
+        try:
+            async for chunk in self._chunks:
+                if chunk:
+                    self.size += len(chunk)
+                    return chunk
+            return b""
+        finally:
+            self.wait_ms += (time.perf_counter() - start_time) * 1000
+
+async def stream_json(response: httpx.Response, fields: List[Path]) -> Any:
+    """Parse a streamed (unread) response body chunk by chunk, keeping only fields"""
+    if not INCREMENTAL:
+        await response.aread()
+        return read_json(response, fields)
+    import ijson
+    body = _AsyncBody(response.aiter_bytes(16384))
+    builder = ijson.ObjectBuilder()
+    events = _EventFilter(fields)
+    start_time = time.perf_counter()
+    async for event, value in ijson.basic_parse_async(body, use_float=True):
+        if events.wanted(event, value):
+            builder.event(event, value)
+    # Time spent waiting for chunks is transfer, the rest is parsing - which
+    # the body's transfer trace also spans, so move it out of transfer
+    parse_ms = (time.perf_counter() - start_time) * 1000 - body.wait_ms
+    add_phase("parse", parse_ms)
+    add_phase("transfer", -parse_ms)
+    _count_bytes(response, body.size)
+    return getattr(builder, "value", None)
+
+def to_text(data: Any, limit: int) -> str:
+    """Compact JSON for tool output, truncated at limit characters"""
+    text = json.dumps(data, separators=(",", ":"), default=str)
+    if len(text) > limit:
+        text = text[:limit] + "\n... (truncated)"
+    return text
+
+metrics.describe("pega_response_bytes_total", "Pega response bytes on the wire (compressed) and after decoding")
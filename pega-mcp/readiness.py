@@ -0,0 +1,150 @@
+"""
+Readiness - Startup Warm-Up
+
+On startup every target is pre-authenticated, WARM_CONNECTIONS pooled
+connections are opened and the case type cache and index are primed, so the
+first tool call pays for none of it. With several worker processes only the
+background leader opens warm connections; the others take the token and case
+types from the shared store. /ready answers 503 until every target has
+warmed up, then 200. A target that fails or takes longer than WARMUP_TIMEOUT
+is retried every WARMUP_RETRY_INTERVAL seconds; with WARMUP_READY_ON_FAILURE
+the server reports ready after the first attempt instead.
+"""
+
+import time
+import asyncio
+import logging
+from typing import Dict, Any, Optional
+
+from metrics import metrics
+from tools import (
+    config, use_target, configured_targets, current_target, get_pega_auth_headers,
+    pega_request, reference_cache, is_background_leader
+)
+from matcher import build_case_type_index
+from scheduler import BACKGROUND, use_priority
+
+logger = logging.getLogger(__name__)
+
+# Close to process start - this module is imported while the server loads
+_process_started_at = time.time()
+
+readiness: Dict[str, Any] = {
+    "ready": False,
+    "started_at": 0.0,
+    "ready_at": 0.0,
+    "targets": {},
+    "first_call": None
+}
+
+_warmup_task: Optional[asyncio.Task] = None
+
+async def _warm_connections(count: int) -> int:
+    """Open pooled connections with concurrent conditional GETs of /casetypes"""
+    entry = reference_cache.get("/casetypes")
+    headers = {"If-None-Match": entry["etag"]} if entry and entry.get("etag") else None
+
+    async def one() -> bool:
+        response = await pega_request("GET", "/casetypes", headers=headers, coalesce=False)
+        return response.status_code in [200, 304]
+
+    results = await asyncio.gather(*(one() for _ in range(count)), return_exceptions=True)
+    return sum(1 for r in results if r is True)
+
+async def _warm_target(name: str) -> None:
+    """Authenticate, open connections and prime caches for one target"""
+    with use_target(name):
+        target = current_target()
+        steps: Dict[str, Any] = {"status": "warming"}
+        readiness["targets"][target.name] = steps
+        start_time = time.perf_counter()
+        try:
+            await get_pega_auth_headers()
+            steps["auth_ms"] = round((time.perf_counter() - start_time) * 1000, 1)
+
+            steps["case_types"] = await build_case_type_index()
+
+            # Other worker processes take the token and case types from the shared store
+            # and leave connection warming to the background leader
+            count = min(config.WARM_CONNECTIONS, target.config.MAX_CONNECTIONS) if is_background_leader() else 0
+            steps["connections"] = await _warm_connections(count) if count > 0 else 0
+            steps["status"] = "ok"
+        except Exception as e:
+            steps["status"] = "error"
+            steps["error"] = str(e)
+            logger.warning(f"Warm-up for {target.name} failed: {str(e)}")
+        steps["ms"] = round((time.perf_counter() - start_time) * 1000, 1)
+
+async def _warm_up() -> None:
+    readiness["started_at"] = time.time()
+    names = [t.name for t in configured_targets()]
+    attempt = 0
+    while names:
+        attempt += 1
+        try:
+            await asyncio.wait_for(asyncio.gather(*(_warm_target(n) for n in names)), config.WARMUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Warm-up attempt {attempt} did not finish within {config.WARMUP_TIMEOUT}s")
+        names = [n for n in names if readiness["targets"].get(n, {}).get("status") != "ok"]
+        if not names:
+            break
+        if config.WARMUP_READY_ON_FAILURE:
+            logger.warning(f"Warm-up failed for {', '.join(names)}, reporting ready anyway (WARMUP_READY_ON_FAILURE)")
+            break
+        for n in names:
+            readiness["targets"][n]["status"] = "retrying"
+        logger.warning(f"Warm-up failed for {', '.join(names)}, not ready - "
+                       f"retrying in {config.WARMUP_RETRY_INTERVAL:g}s")
+        await asyncio.sleep(config.WARMUP_RETRY_INTERVAL)
+
+    readiness["ready"] = True
+    readiness["ready_at"] = time.time()
+    since_start = readiness["ready_at"] - _process_started_at
+    warm_up = readiness["ready_at"] - readiness["started_at"]
+    metrics.set_gauge("mcp_time_to_ready_seconds", None, since_start)
+    summary = ", ".join(f"{n}: {s['status']}" + (f" ({s.get('connections', 0)} connections, "
+                                                   f"{s.get('case_types', 0)} case types)" if s["status"] == "ok" else "")
+                        for n, s in readiness["targets"].items())
+    attempts = f", {attempt} attempts" if attempt > 1 else ""
+    logger.info(f"Ready in {since_start:.2f}s since process start (warm-up {warm_up:.2f}s{attempts}) - {summary}")
+
+def start_warm_up() -> None:
+    """Start the warm-up in the background so /ready can answer meanwhile (called on server startup)"""
+    global _warmup_task
+    if _warmup_task is None or _warmup_task.done():
+        readiness["ready"] = False
+        with use_priority(BACKGROUND):
+            _warmup_task = asyncio.create_task(_warm_up())
+
+async def stop_warm_up() -> None:
+    """Cancel an unfinished warm-up (called on server shutdown)"""
+    global _warmup_task
+    if _warmup_task is not None:
+        _warmup_task.cancel()
+        try:
+            await _warmup_task
+        except asyncio.CancelledError:
+            pass
+    _warmup_task = None
+
+def note_tool_call(tool: str, duration_ms: float) -> None:
+    """Record and log the first tool call served after startup"""
+    if readiness["first_call"] is not None:
+        return
+    readiness["first_call"] = {"tool": tool, "ms": duration_ms, "at": time.time(), "after_ready": readiness["ready"]}
+    metrics.set_gauge("mcp_first_call_ms", {"tool": tool}, duration_ms)
+    when = "after" if readiness["ready"] else "before"
+    logger.info(f"First tool call {tool} took {duration_ms:.1f}ms ({when} ready)")
+
+def readiness_report() -> Dict[str, Any]:
+    """Body of the /ready endpoint"""
+    report: Dict[str, Any] = {"status": "ready" if readiness["ready"] else "warming", "targets": readiness["targets"]}
+    if readiness["ready"]:
+        report["time_to_ready_s"] = round(readiness["ready_at"] - _process_started_at, 3)
+    if readiness["first_call"]:
+        report["first_call"] = {"tool": readiness["first_call"]["tool"], "ms": round(readiness["first_call"]["ms"], 1),
+                               "after_ready": readiness["first_call"]["after_ready"]}
+    return report
+
+metrics.describe("mcp_time_to_ready_seconds", "Seconds from process start until the warm-up finished")
+metrics.describe("mcp_first_call_ms", "Latency of the first tool call served after startup")
@@ -3,61 +3,54 @@ MCP Resources for Pega Server
 """
 
 import time
-import httpx
-from tools import config, get_pega_auth_headers
+from tools import fetch_reference_json, get_auth_stats, get_health
 
 async def get_case_types_resource() -> str:
     """Get case types as a resource"""
-    url = f"{config.api_url}/casetypes"
-    
     try:
-        headers = await get_pega_auth_headers()
+        data, response = await fetch_reference_json("/casetypes")
         
-        async with httpx.AsyncClient(verify=config.VERIFY_SSL) as client:
-            response = await client.get(url, headers=headers)
+        if data is not None:
+            case_types = data.get('caseTypes', [])
             
-            if response.status_code == 200:
-                data = response.json()
-                case_types = data.get('caseTypes', [])
-                
-                if case_types:
-                    result = "Available Case Types:\n"
-                    for ct in case_types:
-                        name = ct.get('name', 'Unknown')
-                        case_id = ct.get('ID', ct.get('id', 'No ID'))
-                        result += f"- {name} ({case_id})\n"
-                else:
-                    result = "No case types available"
+            if case_types:
+                result = "Available Case Types:\n"
+                for ct in case_types:
+                    name = ct.get('name', 'Unknown')
+                    case_id = ct.get('ID', ct.get('id', 'No ID'))
+                    result += f"- {name} ({case_id})\n"
             else:
-                result = f"Failed to get case types: {response.status_code}"
-            
-            return result
-            
+                result = "No case types available"
+        else:
+            result = f"Failed to get case types: {response.status_code}"
+        
+        return result
+        
     except Exception as e:
         return f"Error getting case types: {str(e)}"
 
-async def get_connection_status() -> str:
+async def get_connection_status(force: bool = False) -> str:
     """Get connection status as a resource"""
-    url = f"{config.api_url}/casetypes"
-    
     try:
-        headers = await get_pega_auth_headers()
+        # Answered from the background prober's snapshot unless forced
+        snapshot = await get_health(force)
+        auth = get_auth_stats()
+        last_success = f"{time.time() - snapshot['last_success_at']:.0f}s ago" if snapshot["last_success_at"] else "never"
         
-        async with httpx.AsyncClient(verify=config.VERIFY_SSL) as client:
-            start_time = time.time()
-            response = await client.get(url, headers=headers)
-            response_time = (time.time() - start_time) * 1000
-            
-            if response.status_code == 200:
-                return f"""Connected to Pega
-Response Time: {response_time:.1f}ms
+        if snapshot["status"] == "ok":
+            return f"""Connected to Pega
+Response Time: {snapshot['last_latency_ms']:.1f}ms (avg {snapshot['avg_latency_ms']:.1f}ms)
+Checked: {time.time() - snapshot['last_check_at']:.0f}s ago
+Token Refreshes: {auth['refresh_count']} (avg {auth['avg_refresh_ms']:.1f}ms, failures {auth['refresh_failures']})
 Status: Ready for requests"""
-            else:
-                return f"""Connection Error
-Error: HTTP {response.status_code}
+        else:
+            return f"""Connection Error
+Error: {snapshot['last_error']}
+Error Streak: {snapshot['error_streak']}
+Last Success: {last_success}
 Status: Check configuration"""
-                
+            
     except Exception as e:
         return f"""Connection Error
 Error: {str(e)}
-Status: Check configuration""" 
\ No newline at end of file
+Status: Check configuration"""
\ No newline at end of file
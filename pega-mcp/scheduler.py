@@ -0,0 +1,149 @@
+"""
+Request Scheduler - Priority Classes Sharing One Concurrency Budget
+
+Every outbound Pega request takes one of a target's MAX_CONCURRENT_REQUESTS
+slots. While slots are free they are granted at once; when all are taken,
+waiters queue per priority class (interactive, background, bulk) and freed
+slots go out by weighted fair queuing: each waiter is stamped with a virtual
+finish time advancing by 1/weight within its class, and the earliest stamp
+goes next. A busy class therefore gets its weight's share of the slots and
+an idle class is never starved - a long bulk job cannot hold back
+interactive calls, and bulk still makes progress under interactive load.
+
+The class comes from the context (see use_priority), so tasks started inside
+a use_priority block - bulk jobs, work queue workers - inherit it.
+"""
+
+import time
+import asyncio
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Tuple, Iterator, AsyncIterator
+
+from metrics import metrics
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, BACKGROUND, BULK)
+
+_current_priority: ContextVar[str] = ContextVar("request_priority", default=INTERACTIVE)
+
+def current_priority() -> str:
+    """The priority class Pega calls in this context are scheduled under"""
+    return _current_priority.get()
+
+@contextmanager
+def use_priority(priority: str) -> Iterator[str]:
+    """Schedule Pega calls in this block - and tasks started from it - under a priority class"""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{priority}'. Available: {', '.join(PRIORITIES)}")
+    token = _current_priority.set(priority)
+    try:
+        yield priority
+    finally:
+        _current_priority.reset(token)
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """"interactive=8,background=2,bulk=1" -> weights, 1 for classes not named"""
+    weights = {p: 1.0 for p in PRIORITIES}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        name = name.strip()
+        if name in weights and value.strip():
+            weights[name] = max(float(value), 0.01)
+    return weights
+
+class RequestScheduler:
+    """A target's request slots, handed out by weighted fair queuing across priority classes"""
+
+    def __init__(self, capacity: int, weights: Dict[str, float]):
+        self.capacity = max(capacity, 1)
+        self.weights = weights
+        self.active = 0
+        self.active_by_class = {p: 0 for p in PRIORITIES}
+        self.dispatched = {p: 0 for p in PRIORITIES}
+        self.queues: Dict[str, deque] = {p: deque() for p in PRIORITIES}
+        self.virtual_time = 0.0
+        self._last_finish = {p: 0.0 for p in PRIORITIES}
+
+    def queued(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+    def _grant(self, priority: str) -> None:
+        self.active += 1
+        self.active_by_class[priority] += 1
+        self.dispatched[priority] += 1
+
+    def _dispatch(self) -> None:
+        """Hand free slots to the waiters with the earliest finish times"""
+        while self.active < self.capacity:
+            heads = [(q[0][0], p) for p, q in self.queues.items() if q]
+            if not heads:
+                return
+            finish, priority = min(heads)
+            _, waiter = self.queues[priority].popleft()
+            if waiter.done():
+                continue
+            self.virtual_time = finish
+            self._grant(priority)
+            waiter.set_result(None)
+
+    async def acquire(self, priority: str) -> None:
+        """Wait for a slot under a priority class"""
+        if self.active < self.capacity and not self.queued():
+            self._grant(priority)
+            return
+        # A class that was idle starts from the current virtual time, not its old backlog
+        finish = max(self.virtual_time, self._last_finish[priority]) + 1 / self.weights[priority]
+        self._last_finish[priority] = finish
+        entry: Tuple[float, asyncio.Future] = (finish, asyncio.get_running_loop().create_future())
+        self.queues[priority].append(entry)
+        try:
+            await entry[1]
+        except asyncio.CancelledError:
+            if entry[1].done() and not entry[1].cancelled():
+                # Granted just as the waiter was cancelled - pass the slot on
+                self.release(priority)
+            elif entry in self.queues[priority]:
+                self.queues[priority].remove(entry)
+            raise
+
+    def release(self, priority: str) -> None:
+        self.active -= 1
+        self.active_by_class[priority] -= 1
+        self._dispatch()
+
+    async def wait(self, priority: str) -> None:
+        """Acquire a slot, recording how long it took - the caller must release it"""
+        start_time = time.perf_counter()
+        await self.acquire(priority)
+        metrics.observe("pega_scheduler_wait_ms", {"priority": priority}, (time.perf_counter() - start_time) * 1000)
+
+    @asynccontextmanager
+    async def slot(self, priority: str) -> AsyncIterator[None]:
+        """Hold one slot for the block"""
+        await self.wait(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def samples(self, target: str) -> List[Tuple[str, Dict[str, str], float, str]]:
+        """Per-class queue depth, active and dispatched counts for the metrics registry"""
+        result = []
+        for p in PRIORITIES:
+            labels = {"target": target, "priority": p}
+            result.append(("pega_scheduler_queue_depth", labels, len(self.queues[p]), "gauge"))
+            result.append(("pega_scheduler_active_requests", labels, self.active_by_class[p], "gauge"))
+            result.append(("pega_scheduler_dispatched_total", labels, self.dispatched[p], "counter"))
+        return result
+
+    def summary(self) -> Dict[str, Any]:
+        return {p: {"active": self.active_by_class[p], "queued": len(self.queues[p])} for p in PRIORITIES}
+
+metrics.describe("pega_scheduler_wait_ms", "Time outbound Pega requests waited for a slot, by priority class")
+metrics.describe("pega_scheduler_queue_depth", "Outbound Pega requests waiting for a slot, by priority class")
+metrics.describe("pega_scheduler_active_requests", "Outbound Pega requests holding a slot, by priority class")
+metrics.describe("pega_scheduler_dispatched_total", "Slots granted to outbound Pega requests, by priority class")
@@ -3,15 +3,44 @@
 MCP Pega Server - Simple async MCP server for Pega DX APIs
 
 Usage: python server.py
+       MCP_TRANSPORT=stdio python server.py
 """
 
+import os
+import hmac
+import time
 import asyncio
 import logging
-from typing import Dict, Any, List
-from fastmcp import FastMCP
+import uvicorn
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional
+from pydantic import AnyUrl
+from fastmcp import FastMCP, Context
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+from fastmcp.server.dependencies import get_http_headers
+from fastmcp.server.auth import AuthContext
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, JSONResponse
 
 # Import business logic
-from tools import config, verify_pega_connectivity, get_case_types, create_case
+from tools import (
+    config, configured_targets, use_target, list_targets, verify_pega_connectivity, get_case_types, create_case,
+    get_case_type_action, invalidate_case_type_cache, create_cases_batch,
+    open_http_client, close_http_client, start_background_tasks, stop_background_tasks,
+    shared_store, reference_store, local_path
+)
+from bulk import (
+    get_bulk_actions, submit_bulk_action, format_job_status, list_jobs,
+    cancel_bulk_job, shutdown_bulk_jobs
+)
+from hierarchy import get_case_descendants, get_case_ancestors
+from matcher import match_case_type
+from cases import get_case_details, get_case_view, get_participant_roles, perform_case_action, change_case_stage, create_and_advance_case
+from workqueue import start_work_queue, format_run_status, list_runs, stop_work_queue, shutdown_work_queues
+from metrics import metrics
+from diagnostics import FlightRecorder, trace_call, profile_event_loop
+from readiness import start_warm_up, stop_warm_up, note_tool_call, readiness, readiness_report
+from attachments import get_attachment_categories, upload_attachment, download_attachment, download_document, read_download_chunk
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -21,26 +50,259 @@ logger = logging.getLogger(__name__)
 # MCP Server
 # ============================================================================
 
-mcp = FastMCP("MCPPegaServer")
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """Open shared Pega resources on startup, release them on shutdown"""
+    shared_store.purge_expired()
+    reference_store.purge_expired()
+    await open_http_client()
+    await start_background_tasks()
+    start_warm_up()
+    try:
+        yield
+    finally:
+        await stop_warm_up()
+        await shutdown_bulk_jobs()
+        await shutdown_work_queues()
+        await stop_background_tasks()
+        await close_http_client()
+        shared_store.close()
+        reference_store.close()
+
+flight_recorder = FlightRecorder(config.SLOW_CALL_BUFFER_SIZE, config.SLOW_CALL_THRESHOLD_MS)
+
+class MetricsMiddleware(Middleware):
+    """Time every tool call and resource read"""
+    
+    async def on_call_tool(self, context: MiddlewareContext, call_next):
+        start_time = time.perf_counter()
+        error = True
+        with trace_call(context.message.name) as trace:
+            try:
+                with metrics.track("mcp_tool", {"tool": context.message.name}):
+                    result = await call_next(context)
+                error = False
+                return result
+            finally:
+                duration_ms = (time.perf_counter() - start_time) * 1000
+                flight_recorder.record(trace, duration_ms, error)
+                note_tool_call(context.message.name, duration_ms)
+    
+    async def on_read_resource(self, context: MiddlewareContext, call_next):
+        # Label by resource family (pega://bulk-jobs/{job_id} -> pega://bulk-jobs)
+        uri = str(context.message.uri)
+        resource = "/".join(uri.split("/")[:3])
+        with metrics.track("mcp_resource", {"resource": resource}):
+            return await call_next(context)
+
+mcp = FastMCP("MCPPegaServer", lifespan=lifespan, middleware=[MetricsMiddleware()])
 
 # ============================================================================
 # MCP Tools
 # ============================================================================
 
 @mcp.tool()
-async def verify_pega_connectivity_tool():
-    """Verify connectivity to Pega Platform"""
-    return await verify_pega_connectivity()
+async def list_pega_targets_tool():
+    """List the Pega targets this server fronts. Pass a name as the target parameter of other tools"""
+    return list_targets()
 
 @mcp.tool()
-async def get_case_types_tool():
+async def verify_pega_connectivity_tool(force: bool = False, target: str = ""):
+    """Verify connectivity to Pega Platform. Set force=true for a live probe instead of the latest health check"""
+    with use_target(target):
+        return await verify_pega_connectivity(force)
+
+@mcp.tool()
+async def get_case_types_tool(target: str = ""):
     """Get available case types"""
-    return await get_case_types()
+    with use_target(target):
+        return await get_case_types()
 
 @mcp.tool()
-async def create_case_tool(case_type_id: str):
+async def match_case_type_tool(query: str, limit: int = 3, target: str = ""):
+    """Find the case types best matching a phrase like "home loan", ranked with scores"""
+    with use_target(target):
+        return await match_case_type(query, limit)
+
+@mcp.tool()
+async def create_case_tool(case_type_id: str, target: str = ""):
     """Create a new case"""
-    return await create_case(case_type_id)
+    with use_target(target):
+        return await create_case(case_type_id)
+
+@mcp.tool()
+async def create_cases_batch_tool(cases: List[Dict[str, Any]], ctx: Context, target: str = ""):
+    """Create many cases in one call. Each item: {"caseTypeID": "...", "content": {...}} (content optional)"""
+    async def progress(done: int, total: int):
+        await ctx.report_progress(progress=done, total=total)
+    with use_target(target):
+        return await create_cases_batch(cases, progress)
+
+@mcp.tool()
+async def get_bulk_actions_tool(case_ids: List[str], target: str = ""):
+    """Get the bulk actions available for a selection of cases"""
+    with use_target(target):
+        return await get_bulk_actions(case_ids)
+
+@mcp.tool()
+async def submit_bulk_action_tool(case_ids: List[str], action_id: str, ctx: Context,
+                                  content: Optional[Dict[str, Any]] = None, target: str = ""):
+    """Run a bulk action on many cases as a background job. Returns a job ID immediately"""
+    session = ctx.session
+    
+    async def on_update(job_id: str):
+        await session.send_resource_updated(AnyUrl(f"pega://bulk-jobs/{job_id}"))
+    
+    with use_target(target):
+        return await submit_bulk_action(case_ids, action_id, content, on_update)
+
+@mcp.tool()
+async def get_bulk_job_status_tool(job_id: str):
+    """Get progress of a bulk action job"""
+    return format_job_status(job_id)
+
+@mcp.tool()
+async def cancel_bulk_job_tool(job_id: str):
+    """Cancel a running bulk action job"""
+    return await cancel_bulk_job(job_id)
+
+@mcp.tool()
+async def start_work_queue_tool(ctx: Context, action_id: str = "", content: Optional[Dict[str, Any]] = None,
+                                workers: int = 0, rate_limit: Optional[float] = None, max_items: int = 0,
+                                target: str = ""):
+    """Drain the next-assignment work queue in the background with a pool of workers. Returns a run ID immediately"""
+    session = ctx.session
+    
+    async def on_update(run_id: str):
+        await session.send_resource_updated(AnyUrl(f"pega://work-queues/{run_id}"))
+    
+    with use_target(target):
+        return await start_work_queue(action_id, content, workers, rate_limit, max_items, on_update)
+
+@mcp.tool()
+async def get_work_queue_status_tool(run_id: str):
+    """Get throughput, queue lag and progress of a work queue run"""
+    return format_run_status(run_id)
+
+@mcp.tool()
+async def stop_work_queue_tool(run_id: str):
+    """Stop a work queue run once in-flight submissions finish"""
+    return await stop_work_queue(run_id)
+
+@mcp.tool()
+async def get_case_details_tool(case_id: str, refresh: bool = False, fields: str = "", target: str = ""):
+    """Get case details. Served from cache unless refresh is set.
+    
+    fields is an optional comma-separated list of paths such as
+    "data.caseInfo.status,data.caseInfo.assignments.ID" to get just those as JSON.
+    """
+    with use_target(target):
+        return await get_case_details(case_id, refresh, fields)
+
+@mcp.tool()
+async def get_case_view_tool(case_id: str, view_id: str, fields: str = "", target: str = ""):
+    """Get a case view as JSON. fields is a comma-separated list of paths to keep, e.g.
+    "data.caseInfo.content,uiResources.root"; by default only "data" is returned
+    """
+    with use_target(target):
+        return await get_case_view(case_id, view_id, fields)
+
+@mcp.tool()
+async def perform_case_action_tool(case_id: str, action_id: str, content: Optional[Dict[str, Any]] = None,
+                                   target: str = ""):
+    """Perform a case action, optionally with field content"""
+    with use_target(target):
+        return await perform_case_action(case_id, action_id, content)
+
+@mcp.tool()
+async def create_and_advance_case_tool(case_type_id: str, content: Optional[Dict[str, Any]] = None,
+                                       steps: Optional[List[Dict[str, Any]]] = None, target: str = ""):
+    """Create a case and advance it in one call.
+    
+    steps run in order, each one of {"type": "assignment", "action": ..., "content": {...}},
+    {"type": "case_action", "action": ..., "content": {...}} or {"type": "stage", "stage": "next"}.
+    With no steps, the first assignment's first action is performed.
+    """
+    with use_target(target):
+        return await create_and_advance_case(case_type_id, content, steps)
+
+@mcp.tool()
+async def change_case_stage_tool(case_id: str, stage_id: str = "", target: str = ""):
+    """Move a case to the next stage, or to stage_id when given"""
+    with use_target(target):
+        return await change_case_stage(case_id, stage_id)
+
+@mcp.tool()
+async def get_case_descendants_tool(case_id: str, ctx: Context, max_depth: int = 10, target: str = ""):
+    """Get the descendant case hierarchy. Levels are streamed as progress messages.
+
+    Each case's children are cached for a short time as a compact list (ID,
+    name, status) rather than as whole subtrees, so the cache stays within
+    HIERARCHY_CACHE_SIZE entries; repeat calls within the TTL are served from it.
+    """
+    async def on_level(found: int, lines: str):
+        await ctx.report_progress(progress=found, message=lines)
+    with use_target(target):
+        return await get_case_descendants(case_id, max_depth, on_level)
+
+@mcp.tool()
+async def get_case_ancestors_tool(case_id: str, target: str = ""):
+    """Get the ancestor case hierarchy"""
+    with use_target(target):
+        return await get_case_ancestors(case_id)
+
+@mcp.tool()
+async def get_participant_roles_tool(case_id: str, target: str = ""):
+    """Get the participant roles of a case"""
+    with use_target(target):
+        return await get_participant_roles(case_id)
+
+@mcp.tool()
+async def get_attachment_categories_tool(case_id: str, target: str = ""):
+    """Get the attachment categories available on a case"""
+    with use_target(target):
+        return await get_attachment_categories(case_id)
+
+@mcp.tool()
+async def upload_attachment_tool(case_id: str, file_path: str, category: str = "File", name: str = "",
+                                 target: str = ""):
+    """Upload a file from the server's upload directory (path relative to it) and attach it to a case"""
+    with use_target(target):
+        return await upload_attachment(case_id, file_path, category, name)
+
+@mcp.tool()
+async def download_attachment_tool(attachment_id: str, dest_path: str = "", target: str = ""):
+    """Download attachment content to a file in the server's download directory (dest_path relative to it)"""
+    with use_target(target):
+        return await download_attachment(attachment_id, dest_path)
+
+@mcp.tool()
+async def download_document_tool(document_id: str, dest_path: str = "", target: str = ""):
+    """Download document content to a file in the server's download directory (dest_path relative to it)"""
+    with use_target(target):
+        return await download_document(document_id, dest_path)
+
+@mcp.tool()
+async def get_case_type_action_tool(case_type_id: str, action_id: str, target: str = ""):
+    """Get bulk action details for a case type"""
+    with use_target(target):
+        return await get_case_type_action(case_type_id, action_id)
+
+@mcp.tool()
+async def invalidate_case_type_cache_tool(target: str = ""):
+    """Clear cached case types so the next request fetches them from Pega"""
+    with use_target(target):
+        return await invalidate_case_type_cache()
+
+def _admin_only(context: AuthContext) -> bool:
+    """Admin tools are listed and callable only with ADMIN_KEY in the X-Admin-Key header"""
+    key = get_http_headers().get("x-admin-key", "")
+    return bool(config.ADMIN_KEY) and hmac.compare_digest(key.encode(), config.ADMIN_KEY.encode())
+
+@mcp.tool(auth=_admin_only, tags={"admin"})
+async def profile_server_tool(seconds: float = 5, top: int = 15):
+    """Admin only: sample the server's event loop for a few seconds (max 60) and return the hottest functions"""
+    return await profile_event_loop(seconds, top)
 
 # ============================================================================
 # MCP Resources
@@ -58,23 +320,104 @@ async def get_connection_status() -> str:
     from resources import get_connection_status
     return await get_connection_status()
 
+@mcp.resource("pega://connection-status/live")
+async def get_live_connection_status() -> str:
+    """Get connection status from a live probe"""
+    from resources import get_connection_status
+    return await get_connection_status(force=True)
+
+@mcp.resource("pega://targets")
+async def get_targets() -> str:
+    """List Pega targets with their health and load"""
+    return list_targets()
+
+@mcp.resource("pega://metrics")
+async def get_metrics() -> str:
+    """Latency, status code, in-flight, cache and auth metrics"""
+    return metrics.render_text()
+
+@mcp.resource("pega://slow-calls")
+async def get_slow_calls() -> str:
+    """Recent slow tool calls with time spent in auth, queueing, connect, Pega, transfer, parsing and formatting"""
+    return flight_recorder.render()
+
+@mcp.resource("pega://bulk-jobs")
+async def get_bulk_jobs() -> str:
+    """List bulk action jobs"""
+    return list_jobs()
+
+@mcp.resource("pega://bulk-jobs/{job_id}")
+async def get_bulk_job(job_id: str) -> str:
+    """Get progress of a bulk action job"""
+    return format_job_status(job_id)
+
+@mcp.resource("pega://work-queues")
+async def get_work_queues() -> str:
+    """List work queue runs"""
+    return list_runs()
+
+@mcp.resource("pega://work-queues/{run_id}")
+async def get_work_queue(run_id: str) -> str:
+    """Get throughput, queue lag and progress of a work queue run"""
+    return format_run_status(run_id)
+
+@mcp.resource("pega://downloads/{file_name}/{index}", mime_type="application/octet-stream")
+async def get_download_chunk(file_name: str, index: int) -> bytes:
+    """Read one chunk of a downloaded attachment or document"""
+    return read_download_chunk(file_name, int(index))
+
+# ============================================================================
+# HTTP Routes
+# ============================================================================
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def prometheus_metrics(request: Request) -> PlainTextResponse:
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@mcp.custom_route("/ready", methods=["GET"])
+async def ready(request: Request) -> JSONResponse:
+    """Readiness probe - 503 until the startup warm-up has finished"""
+    return JSONResponse(readiness_report(), status_code=200 if readiness["ready"] else 503)
+
 # ============================================================================
 # Main
 # ============================================================================
 
+def create_http_app():
+    """ASGI app for each worker process in multi-worker mode.
+    
+    Stateless HTTP, since consecutive requests of one MCP session may reach
+    different workers.
+    """
+    return mcp.http_app(stateless_http=True)
+
 if __name__ == "__main__":
     # Check configuration
-    if not config.is_configured():
+    if not configured_targets():
         logger.error("Missing configuration. Check your env file.")
         exit(1)
     
-    logger.info(f"Starting MCP Pega Server for {config.BASE_URL}")
+    for target in configured_targets():
+        logger.info(f"Starting MCP Pega Server for {target.name}: {target.config.api_url}")
     
    
-    asyncio.run(
-        mcp.run_async(
-            transport='streamable-http',
-            host='0.0.0.0',
-            port=8082
-        )
-    ) 
\ No newline at end of file
+    if config.MCP_TRANSPORT == "stdio":
+        # Launched by a co-located agent - stdout carries the MCP stream, logs go to stderr
+        asyncio.run(mcp.run_async(transport="stdio"))
+    elif config.MCP_WORKERS > 1:
+        # Workers share tokens, reference data and job status through the store
+        # An empty value (as in env.template) means unset here - without a store every worker would lead
+        if not os.environ.get("SHARED_STORE_PATH"):
+            os.environ["SHARED_STORE_PATH"] = local_path(".pega-mcp-store.db")
+        logger.info(f"Starting {config.MCP_WORKERS} workers sharing {os.environ['SHARED_STORE_PATH']}")
+        uvicorn.run("server:create_http_app", factory=True, host='0.0.0.0', port=8082,
+                    workers=config.MCP_WORKERS)
+    else:
+        asyncio.run(
+            mcp.run_async(
+                transport='streamable-http',
+                host='0.0.0.0',
+                port=8082
+            )
+        ) 
\ No newline at end of file
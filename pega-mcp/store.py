@@ -0,0 +1,118 @@
+"""
+Shared Store - State Shared by Worker Processes
+
+A local SQLite file (WAL mode) that lets server worker processes on one host
+share OAuth tokens, hot reference cache entries and job status snapshots.
+With no path configured every call is a no-op.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS kv_expires_at ON kv (expires_at);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+class SharedStore:
+    """Key/value entries with expiry, plus short leases for cross-process single-flight"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.stats = {"reads": 0, "hits": 0, "writes": 0, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+            logger.info(f"Shared store opened at {self.path}")
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Cursor]:
+        """Run one statement - store errors are logged, never raised to request paths"""
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                return self._connect().execute(sql, params)
+        except sqlite3.Error as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Shared store error: {str(e)}")
+            return None
+
+    def get_json(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        self.stats["reads"] += 1
+        cursor = self._execute("SELECT value FROM kv WHERE key = ? AND expires_at > ?", (key, time.time()))
+        row = cursor.fetchone() if cursor else None
+        if row is None:
+            return None
+        self.stats["hits"] += 1
+        return json.loads(row[0])
+
+    def put_json(self, key: str, value: Any, ttl: float) -> None:
+        if not self.enabled:
+            return
+        self.stats["writes"] += 1
+        self._execute("INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                      (key, json.dumps(value), time.time() + ttl))
+
+    def delete(self, key: str) -> None:
+        self._execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix: str) -> None:
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        self._execute("DELETE FROM kv WHERE key LIKE ? ESCAPE '\\'", (escaped + "%",))
+
+    def acquire_lease(self, name: str, ttl: float) -> bool:
+        """Take a named lease unless another live process holds it"""
+        if not self.enabled:
+            return True
+        now = time.time()
+        cursor = self._execute(
+            "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+            "WHERE leases.expires_at < ? OR leases.holder = excluded.holder",
+            (name, os.getpid(), now + ttl, now))
+        # When the store is failing, behave as if there were no other workers
+        return cursor is None or cursor.rowcount == 1
+
+    def release_lease(self, name: str) -> None:
+        self._execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, os.getpid()))
+
+    def purge_expired(self) -> None:
+        now = time.time()
+        self._execute("DELETE FROM kv WHERE expires_at <= ?", (now,))
+        self._execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
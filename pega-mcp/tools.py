@@ -3,11 +3,22 @@ Pega API Tools - Business Logic Functions
 """
 
 import os
+import json
+import random
+import asyncio
 import httpx
 import logging
 import time
-from typing import Dict, Any, Optional, List
+from contextlib import contextmanager
+from contextvars import ContextVar
+from urllib.parse import quote
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable, Iterator
 from dotenv import load_dotenv
+from metrics import metrics, InstrumentedTransport, endpoint_label
+from store import SharedStore
+from payloads import Path, read_json
+from diagnostics import phase, add_phase, http_trace_hook
+from scheduler import RequestScheduler, INTERACTIVE, BACKGROUND, BULK, use_priority, current_priority, parse_weights
 
 # Load environment variables
 load_dotenv('.env')
@@ -30,6 +41,50 @@ class Config:
     VERIFY_SSL = os.getenv("VERIFY_SSL", "true").lower() == "true"
     MAX_CONNECTIONS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "10"))
     TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", "30"))
+    HTTP2 = os.getenv("HTTP2_ENABLED", "false").lower() == "true"
+    KEEPALIVE_EXPIRY = float(os.getenv("KEEPALIVE_EXPIRY", "30"))
+    TOKEN_REFRESH_AHEAD = int(os.getenv("TOKEN_REFRESH_AHEAD", "300"))
+    TOKEN_RETRY_INTERVAL = int(os.getenv("TOKEN_RETRY_INTERVAL", "10"))
+    CASE_TYPE_CACHE_TTL = int(os.getenv("CASE_TYPE_CACHE_TTL", "300"))
+    MAX_OUTPUT_CHARS = int(os.getenv("MAX_OUTPUT_CHARS", "4000"))
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "5"))
+    BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "100"))
+    BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "2"))
+    BULK_JOB_HISTORY = int(os.getenv("BULK_JOB_HISTORY", "50"))
+    HIERARCHY_CONCURRENCY = int(os.getenv("HIERARCHY_CONCURRENCY", "5"))
+    HIERARCHY_CACHE_TTL = int(os.getenv("HIERARCHY_CACHE_TTL", "30"))
+    HIERARCHY_CACHE_SIZE = int(os.getenv("HIERARCHY_CACHE_SIZE", "5000"))
+    ATTACHMENT_CHUNK_SIZE = int(os.getenv("ATTACHMENT_CHUNK_SIZE", str(1024 * 1024)))
+    MMAP_THRESHOLD = int(os.getenv("MMAP_THRESHOLD", str(64 * 1024 * 1024)))
+    TRANSFER_TIMEOUT = int(os.getenv("TRANSFER_TIMEOUT", "600"))
+    UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+    DOWNLOAD_DIR = os.getenv("DOWNLOAD_DIR", "downloads")
+    RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+    RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.2"))
+    RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "5"))
+    RETRY_AFTER_MAX = float(os.getenv("RETRY_AFTER_MAX", "30"))
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+    HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "15"))
+    HEALTH_EWMA_ALPHA = float(os.getenv("HEALTH_EWMA_ALPHA", "0.2"))
+    CASE_CACHE_TTL = int(os.getenv("CASE_CACHE_TTL", "60"))
+    CASE_CACHE_SIZE = int(os.getenv("CASE_CACHE_SIZE", "1000"))
+    QUEUE_WORKERS = int(os.getenv("QUEUE_WORKERS", "4"))
+    QUEUE_RATE_LIMIT = float(os.getenv("QUEUE_RATE_LIMIT", "0"))
+    QUEUE_RUN_HISTORY = int(os.getenv("QUEUE_RUN_HISTORY", "20"))
+    MCP_WORKERS = int(os.getenv("MCP_WORKERS", "1"))
+    MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "streamable-http")
+    SHARED_STORE_PATH = os.getenv("SHARED_STORE_PATH", "")
+    REFERENCE_CACHE_PATH = os.getenv("REFERENCE_CACHE_PATH", ".pega-mcp-cache.db")
+    REFERENCE_CACHE_MAX_AGE = int(os.getenv("REFERENCE_CACHE_MAX_AGE", "86400"))
+    WARM_CONNECTIONS = int(os.getenv("WARM_CONNECTIONS", "4"))
+    WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "30"))
+    WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "5"))
+    WARMUP_READY_ON_FAILURE = os.getenv("WARMUP_READY_ON_FAILURE", "false").lower() == "true"
+    SCHEDULER_WEIGHTS = os.getenv("SCHEDULER_WEIGHTS", "interactive=8,background=2,bulk=1")
+    SLOW_CALL_THRESHOLD_MS = float(os.getenv("SLOW_CALL_THRESHOLD_MS", "1000"))
+    SLOW_CALL_BUFFER_SIZE = int(os.getenv("SLOW_CALL_BUFFER_SIZE", "50"))
+    ADMIN_KEY = os.getenv("ADMIN_KEY", "")
     
     @property
     def token_url(self) -> str:
@@ -45,107 +100,1042 @@ class Config:
 
 config = Config()
 
+# Tokens and job status shared with other worker processes
+shared_store = SharedStore(config.SHARED_STORE_PATH)
+
+def local_path(path: str) -> str:
+    """Relative paths are kept next to this file, whatever the working directory"""
+    return path if not path or os.path.isabs(path) else os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+
+# Slow-changing reference data, kept on disk across restarts and shared by worker processes
+reference_store = SharedStore(local_path(config.REFERENCE_CACHE_PATH))
+
+def _store_samples():
+    samples = [("pega_shared_store_ops_total", {"op": k}, v, "counter") for k, v in shared_store.stats.items()]
+    samples += [("pega_reference_store_ops_total", {"op": k}, v, "counter") for k, v in reference_store.stats.items()]
+    return samples
+
+metrics.register_collector(_store_samples)
+
 # ============================================================================
-# OAuth Token Management
+# Pega Targets
 # ============================================================================
 
-# Global token cache
-_access_token: Optional[str] = None
-_token_expires_at: float = 0
+# Connection settings a named target can override with PEGA_<NAME>_<SETTING>
+_TARGET_SETTINGS = {
+    "BASE_URL": ("BASE_URL", str),
+    "CLIENT_ID": ("CLIENT_ID", str),
+    "CLIENT_SECRET": ("CLIENT_SECRET", str),
+    "APP_ALIAS": ("APP_ALIAS", str),
+    "API_BASE_PATH": ("API_BASE_PATH", str),
+    "OAUTH2_TOKEN_URL": ("OAUTH2_TOKEN_URL", str),
+    "VERIFY_SSL": ("VERIFY_SSL", bool),
+    "MAX_CONCURRENT_REQUESTS": ("MAX_CONNECTIONS", int),
+    "REQUEST_TIMEOUT": ("TIMEOUT", int)
+}
 
-async def get_pega_auth_headers() -> Dict[str, str]:
-    """Get authenticated headers - reuses cached token"""
-    global _access_token, _token_expires_at
-    
-    # Check if token is still valid (with 60s buffer)
-    if _access_token and time.time() < _token_expires_at - 60:
-        return {
-            "Authorization": f"Bearer {_access_token}",
-            "Content-Type": "application/json",
-            "Accept": "application/json"
+DEFAULT_TARGET = "default"
+
+def _target_config(name: str) -> Config:
+    """Config for a named target - its PEGA_<NAME>_* variables over the defaults"""
+    target_config = Config()
+    prefix = f"PEGA_{name.upper().replace('-', '_')}_"
+    for setting, (attr, kind) in _TARGET_SETTINGS.items():
+        value = os.getenv(prefix + setting)
+        if value is not None:
+            setattr(target_config, attr, value.lower() == "true" if kind is bool else kind(value))
+    return target_config
+
+class PegaTarget:
+    """One Pega application - its own connection pool, token, breakers and concurrency budget"""
+    
+    def __init__(self, name: str, target_config: Config):
+        self.name = name
+        self.config = target_config
+        self.http_client: Optional[httpx.AsyncClient] = None
+        
+        # Token cache - only one token request is in flight at a time
+        self.access_token: Optional[str] = None
+        self.token_expires_at = 0.0
+        self.token_issued_at = 0.0
+        self.token_lock = asyncio.Lock()
+        self.token_refresh_task: Optional[asyncio.Task] = None
+        self.auth_stats: Dict[str, Any] = {
+            "refresh_count": 0,
+            "refresh_failures": 0,
+            "shared_adoptions": 0,
+            "last_refresh_ms": 0.0,
+            "total_refresh_ms": 0.0,
+            "last_refresh_at": 0.0
+        }
+        
+        self.breakers: Dict[str, "CircuitBreaker"] = {}
+        # Identical GETs in flight, shared by all callers asking for the same thing
+        self.inflight: Dict[Tuple, asyncio.Task] = {}
+        # Requests waiting for or holding one of MAX_CONCURRENT_REQUESTS slots, by priority class
+        self.scheduler = RequestScheduler(target_config.MAX_CONNECTIONS, parse_weights(config.SCHEDULER_WEIGHTS))
+        
+        # Rolling health snapshot, kept current by the background prober
+        self.health: Dict[str, Any] = {
+            "status": "unknown",
+            "last_latency_ms": 0.0,
+            "avg_latency_ms": 0.0,
+            "error_streak": 0,
+            "last_error": "",
+            "last_success_at": 0.0,
+            "last_check_at": 0.0,
+            "checks": 0
         }
+
+# Registry of Pega targets - "default" from the PEGA_* settings, plus one per PEGA_TARGETS name
+targets: Dict[str, PegaTarget] = {DEFAULT_TARGET: PegaTarget(DEFAULT_TARGET, config)}
+for _name in (n.strip() for n in os.getenv("PEGA_TARGETS", "").split(",")):
+    if _name and _name != DEFAULT_TARGET:
+        targets[_name] = PegaTarget(_name, _target_config(_name))
+
+_current_target: ContextVar[PegaTarget] = ContextVar("pega_target", default=targets[DEFAULT_TARGET])
+
+def current_target() -> PegaTarget:
+    """The target Pega calls in this context go to"""
+    return _current_target.get()
+
+def configured_targets() -> List[PegaTarget]:
+    return [t for t in targets.values() if t.config.is_configured()]
+
+@contextmanager
+def use_target(name: str = "") -> Iterator[PegaTarget]:
+    """Route Pega calls in this block - and tasks started from it - to a named target"""
+    target = targets.get(name or DEFAULT_TARGET)
+    if target is None:
+        raise ValueError(f"Unknown Pega target '{name}'. Available: {', '.join(targets)}")
+    token = _current_target.set(target)
+    try:
+        yield target
+    finally:
+        _current_target.reset(token)
+
+def list_targets() -> str:
+    """Summarize registered targets with their health and load"""
+    output = f"Pega targets ({len(targets)}):\n"
+    for target in targets.values():
+        if not target.config.is_configured():
+            output += f"- {target.name}: not configured\n"
+            continue
+        token = "valid" if _token_valid(target) else "none"
+        scheduler = target.scheduler
+        output += (f"- {target.name}: {target.config.api_url}\n"
+                   f"    health {target.health['status']}, token {token}, "
+                   f"{scheduler.active}/{scheduler.capacity} requests active, {scheduler.queued()} queued\n")
+    return output
+
+# ============================================================================
+# HTTP Client Pool
+# ============================================================================
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _build_http_client(target: PegaTarget) -> httpx.AsyncClient:
+    """Build a target's pooled client - keep-alive, optional HTTP/2, MAX_CONNECTIONS cap"""
+    target_config = target.config
+    http2 = target_config.HTTP2
+    if http2 and not _http2_available():
+        logger.warning("HTTP2_ENABLED is set but the h2 package is not installed, using HTTP/1.1")
+        http2 = False
+    
+    limits = httpx.Limits(
+        max_connections=target_config.MAX_CONNECTIONS,
+        max_keepalive_connections=target_config.MAX_CONNECTIONS,
+        keepalive_expiry=target_config.KEEPALIVE_EXPIRY
+    )
+    transport = httpx.AsyncHTTPTransport(verify=target_config.VERIFY_SSL, limits=limits, http2=http2)
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(target_config.TIMEOUT),
+        transport=InstrumentedTransport(transport, target_config.api_url)
+    )
+
+async def open_http_client() -> None:
+    """Open every configured target's client (called on server startup)"""
+    for target in configured_targets():
+        if target.http_client is None or target.http_client.is_closed:
+            target.http_client = _build_http_client(target)
+            logger.info(f"HTTP client pool opened for {target.name} (max connections: {target.config.MAX_CONNECTIONS})")
+
+async def close_http_client() -> None:
+    """Close every target's client (called on server shutdown)"""
+    for target in targets.values():
+        if target.http_client is not None and not target.http_client.is_closed:
+            await target.http_client.aclose()
+            logger.info(f"HTTP client pool closed for {target.name}")
+        target.http_client = None
+
+def _target_client(target: PegaTarget) -> httpx.AsyncClient:
+    """A target's client - created lazily when used outside the server lifespan"""
+    if target.http_client is None or target.http_client.is_closed:
+        target.http_client = _build_http_client(target)
+    return target.http_client
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the current target's client"""
+    return _target_client(current_target())
+
+# ============================================================================
+# OAuth Token Management
+# ============================================================================
+
+def _auth_samples():
+    samples = []
+    for target in targets.values():
+        stats = target.auth_stats
+        labels = {"target": target.name}
+        samples += [
+            ("pega_auth_refreshes_total", labels, stats["refresh_count"], "counter"),
+            ("pega_auth_refresh_failures_total", labels, stats["refresh_failures"], "counter"),
+            ("pega_auth_refresh_ms_total", labels, stats["total_refresh_ms"], "counter"),
+            ("pega_auth_token_expires_in_seconds", labels, max(target.token_expires_at - time.time(), 0), "gauge")
+        ]
+    return samples
+
+metrics.register_collector(_auth_samples)
+
+def _token_valid(target: PegaTarget) -> bool:
+    """Check if cached token is still valid (with 60s buffer)"""
+    return bool(target.access_token) and time.time() < target.token_expires_at - 60
+
+def _auth_headers(target: PegaTarget) -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {target.access_token}",
+        "Content-Type": "application/json",
+        "Accept": "application/json"
+    }
+
+async def _fetch_token(target: PegaTarget) -> None:
+    """Request a new token from Pega and store it in the target's cache"""
+    target_config = target.config
+    auth_stats = target.auth_stats
     
-    # Re-authenticate when needed
+    start_time = time.time()
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(config.TIMEOUT), verify=config.VERIFY_SSL) as client:
-            response = await client.post(
-                config.token_url,
+        # Every queued call waits on the token, so it takes an interactive slot whatever the caller's class
+        async with target.scheduler.slot(INTERACTIVE):
+            response = await _target_client(target).post(
+                target_config.token_url,
                 data={
                     'grant_type': 'client_credentials',
-                    'client_id': config.CLIENT_ID,
-                    'client_secret': config.CLIENT_SECRET
+                    'client_id': target_config.CLIENT_ID,
+                    'client_secret': target_config.CLIENT_SECRET
                 },
                 headers={'Content-Type': 'application/x-www-form-urlencoded'}
             )
+        
+        if response.status_code == 200:
+            token_data = response.json()
+            target.access_token = token_data.get('access_token')
+            target.token_issued_at = time.time()
+            target.token_expires_at = target.token_issued_at + token_data.get('expires_in', 3600)
+            
+            refresh_ms = (time.time() - start_time) * 1000
+            auth_stats["refresh_count"] += 1
+            auth_stats["last_refresh_ms"] = refresh_ms
+            auth_stats["total_refresh_ms"] += refresh_ms
+            auth_stats["last_refresh_at"] = time.time()
+            logger.info(f"Authentication successful for {target.name} in {refresh_ms:.1f}ms")
+        else:
+            error_msg = f"Authentication failed with status code {response.status_code}"
+            try:
+                error_data = response.json()
+                if 'error_description' in error_data:
+                    error_msg += f": {error_data['error_description']}"
+                elif 'error' in error_data:
+                    error_msg += f": {error_data['error']}"
+            except:
+                error_msg += f" - {response.text[:200]}"
+            
+            logger.error(error_msg)
+            raise Exception(error_msg)
             
-            if response.status_code == 200:
-                token_data = response.json()
-                _access_token = token_data.get('access_token')
-                _token_expires_at = time.time() + token_data.get('expires_in', 3600)
-                logger.info("Authentication successful")
-                return {
-                    "Authorization": f"Bearer {_access_token}",
-                    "Content-Type": "application/json",
-                    "Accept": "application/json"
-                }
-            else:
-                error_msg = f"Authentication failed with status code {response.status_code}"
-                try:
-                    error_data = response.json()
-                    if 'error_description' in error_data:
-                        error_msg += f": {error_data['error_description']}"
-                    elif 'error' in error_data:
-                        error_msg += f": {error_data['error']}"
-                except:
-                    error_msg += f" - {response.text[:200]}"
-                
-                logger.error(error_msg)
-                raise Exception(error_msg)
-                
     except httpx.ConnectError as e:
+        auth_stats["refresh_failures"] += 1
         error_msg = f"Connection error to Pega Platform: {str(e)}"
         logger.error(error_msg)
         raise Exception(error_msg)
     except httpx.TimeoutException as e:
-        error_msg = f"Timeout connecting to Pega Platform after {config.TIMEOUT}s"
+        auth_stats["refresh_failures"] += 1
+        error_msg = f"Timeout connecting to Pega Platform after {target_config.TIMEOUT}s"
         logger.error(error_msg)
         raise Exception(error_msg)
     except Exception as e:
+        auth_stats["refresh_failures"] += 1
         error_msg = f"Authentication error: {str(e)}"
         logger.error(error_msg)
         raise Exception(error_msg)
 
+def _token_store_key(target: PegaTarget) -> str:
+    # Targets with the same credentials share one token
+    return f"token:{target.config.token_url}:{target.config.CLIENT_ID}"
+
+def _adopt_shared_token(target: PegaTarget) -> bool:
+    """Take over a newer token that another worker process already fetched"""
+    shared = shared_store.get_json(_token_store_key(target))
+    if (not shared or shared["access_token"] == target.access_token
+            or shared["expires_at"] <= max(target.token_expires_at, time.time() + 60)):
+        return False
+    target.access_token = shared["access_token"]
+    target.token_expires_at = shared["expires_at"]
+    target.token_issued_at = shared["issued_at"]
+    target.auth_stats["shared_adoptions"] += 1
+    return True
+
+async def _renew_token(target: PegaTarget) -> None:
+    """Get a new token - fetched by one worker process at a time when the shared store is on"""
+    if _adopt_shared_token(target):
+        return
+    
+    lease = f"lease:{_token_store_key(target)}"
+    if not shared_store.acquire_lease(lease, target.config.TIMEOUT):
+        # Another worker is fetching - wait for its token rather than fetching in parallel
+        deadline = time.time() + target.config.TIMEOUT
+        while time.time() < deadline:
+            await asyncio.sleep(0.05)
+            if _adopt_shared_token(target):
+                return
+            if shared_store.acquire_lease(lease, target.config.TIMEOUT):
+                break
+    
+    try:
+        if _adopt_shared_token(target):
+            return
+        await _fetch_token(target)
+        shared_store.put_json(_token_store_key(target), {
+            "access_token": target.access_token,
+            "expires_at": target.token_expires_at,
+            "issued_at": target.token_issued_at
+        }, ttl=max(target.token_expires_at - time.time(), 1))
+    finally:
+        shared_store.release_lease(lease)
+
+async def get_pega_auth_headers() -> Dict[str, str]:
+    """Get authenticated headers for the current target - reuses its cached token"""
+    target = current_target()
+    if _token_valid(target):
+        return _auth_headers(target)
+    
+    # Re-authenticate when needed - concurrent callers wait for the same refresh
+    async with target.token_lock:
+        if not _token_valid(target):
+            await _renew_token(target)
+        return _auth_headers(target)
+
+async def _token_refresh_loop(target: PegaTarget) -> None:
+    """Renew a target's token ahead of expiry so request paths never block on OAuth"""
+    while True:
+        if target.access_token:
+            # Refresh ahead of the 60s validity buffer, at most halfway through short-lived tokens
+            lifetime = target.token_expires_at - target.token_issued_at
+            ahead = min(config.TOKEN_REFRESH_AHEAD, max(lifetime - 60, 0) / 2)
+            delay = max(target.token_expires_at - 60 - ahead - time.time(), 1)
+        else:
+            delay = 0
+        await asyncio.sleep(delay)
+        
+        try:
+            async with target.token_lock:
+                await _renew_token(target)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Background token refresh for {target.name} failed, "
+                           f"retrying in {config.TOKEN_RETRY_INTERVAL}s: {str(e)}")
+            await asyncio.sleep(config.TOKEN_RETRY_INTERVAL)
+
+def start_token_refresher() -> None:
+    """Start a background token refresher per configured target (called on server startup)"""
+    for target in configured_targets():
+        if target.token_refresh_task is None or target.token_refresh_task.done():
+            target.token_refresh_task = asyncio.create_task(_token_refresh_loop(target))
+
+async def stop_token_refresher() -> None:
+    """Stop the background token refreshers (called on server shutdown)"""
+    for target in targets.values():
+        if target.token_refresh_task is not None:
+            target.token_refresh_task.cancel()
+            try:
+                await target.token_refresh_task
+            except asyncio.CancelledError:
+                pass
+        target.token_refresh_task = None
+
+def get_auth_stats() -> Dict[str, Any]:
+    """Token refresh counters for the current target"""
+    target = current_target()
+    count = target.auth_stats["refresh_count"]
+    return {
+        **target.auth_stats,
+        "avg_refresh_ms": target.auth_stats["total_refresh_ms"] / count if count else 0.0,
+        "token_valid": _token_valid(target),
+        "expires_in": max(target.token_expires_at - time.time(), 0)
+    }
+
+# ============================================================================
+# Request Layer - Retries and Circuit Breakers
+# ============================================================================
+
+class CircuitOpenError(Exception):
+    """Raised without calling Pega while an endpoint's circuit is open"""
+
+# Methods that are safe to repeat after a failed attempt
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+class CircuitBreaker:
+    """Per-endpoint breaker - opens after consecutive failures, probes once after a cooldown"""
+    
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.failures = 0
+        self.opened_at = 0.0
+        self.state = "closed"
+        self.probe_in_flight = False
+    
+    def before_request(self) -> None:
+        if self.state == "open":
+            remaining = self.opened_at + config.BREAKER_COOLDOWN - time.time()
+            if remaining > 0:
+                metrics.inc("pega_circuit_rejections_total", {"endpoint": self.endpoint})
+                raise CircuitOpenError(f"Pega endpoint {self.endpoint} is unavailable (circuit open, retry in {remaining:.0f}s)")
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self.probe_in_flight:
+                metrics.inc("pega_circuit_rejections_total", {"endpoint": self.endpoint})
+                raise CircuitOpenError(f"Pega endpoint {self.endpoint} is recovering (probe in progress)")
+            self.probe_in_flight = True
+    
+    def record(self, success: bool) -> None:
+        self.probe_in_flight = False
+        if success:
+            if self.state != "closed":
+                logger.info(f"Circuit closed for {self.endpoint}")
+            self.failures = 0
+            self.state = "closed"
+        else:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= config.BREAKER_FAILURE_THRESHOLD:
+                if self.state != "open":
+                    logger.warning(f"Circuit opened for {self.endpoint} after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.time()
+
+def _breaker_samples():
+    states = {"closed": 0, "half_open": 1, "open": 2}
+    return [("pega_circuit_state", {"target": t.name, "endpoint": b.endpoint}, states[b.state], "gauge")
+            for t in targets.values() for b in t.breakers.values()]
+
+metrics.register_collector(_breaker_samples)
+
+def _is_failure(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response]) -> float:
+    """Retry-After when Pega sends one, otherwise exponential backoff with full jitter"""
+    if response is not None and response.status_code in (429, 503):
+        retry_after = response.headers.get("retry-after", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), config.RETRY_AFTER_MAX)
+    return random.uniform(0, min(config.RETRY_MAX_DELAY, config.RETRY_BASE_DELAY * (2 ** attempt)))
+
+async def _renew_rejected_token(target: PegaTarget, headers: Dict[str, str]) -> None:
+    """Replace a token Pega rejected with 401, unless another caller already did"""
+    async with target.token_lock:
+        if headers.get("Authorization") == f"Bearer {target.access_token}":
+            target.token_expires_at = 0
+            await _renew_token(target)
+
+def _slot_samples():
+    samples = []
+    for t in targets.values():
+        samples.append(("pega_target_active_requests", {"target": t.name}, t.scheduler.active, "gauge"))
+        samples.extend(t.scheduler.samples(t.name))
+    return samples
+
+metrics.register_collector(_slot_samples)
+
+coalesce_stats: Dict[str, int] = {"leaders": 0, "merged": 0}
+
+def _coalesce_samples():
+    return [("pega_coalesced_requests_total", {"role": k}, v, "counter") for k, v in coalesce_stats.items()]
+
+metrics.register_collector(_coalesce_samples)
+
+async def pega_request(method: str, path: str, *, headers: Optional[Dict[str, str]] = None,
+                       retry: bool = True, stream: bool = False, coalesce: bool = True, **kwargs) -> httpx.Response:
+    """Send an authenticated request to the Pega DX API.
+    
+    The request goes to the current target (see use_target), and path is
+    relative to its API base URL. At most MAX_CONCURRENT_REQUESTS requests
+    per target are sent at once; others queue by priority class (see
+    use_priority) and are let through by weighted fair queuing. Idempotent methods are retried on
+    429/5xx and transport errors; other methods only when the request never
+    reached Pega (connect errors) or was rejected with 429. A 401 renews the
+    token and resends once (unless retry=False, for one-shot bodies). Each
+    endpoint has a circuit breaker that fails fast with CircuitOpenError
+    while Pega keeps failing. Error responses are returned, transport errors
+    raised. With stream=True the body is left unread and the caller must
+    close the response, which also frees its request slot.
+    
+    Concurrent identical GETs (same URL, query, headers, client and priority
+    class) share one upstream request; every caller receives the same
+    response object. Callers of different classes are not merged, so an
+    interactive call never waits in a bulk request's queue.
+    """
+    if not coalesce or stream or method.upper() != "GET":
+        return await _send_with_retries(method, path, headers=headers, retry=retry, stream=stream, **kwargs)
+    
+    target = current_target()
+    url = httpx.URL(f"{target.config.api_url}{path}", params=kwargs.get("params"))
+    key = (target.name, str(url), target.config.CLIENT_ID, tuple(sorted((headers or {}).items())), current_priority())
+    task = target.inflight.get(key)
+    if task is not None:
+        coalesce_stats["merged"] += 1
+        return await asyncio.shield(task)
+    
+    coalesce_stats["leaders"] += 1
+    task = asyncio.create_task(_send_with_retries(method, path, headers=headers, retry=retry, **kwargs))
+    target.inflight[key] = task
+    
+    def _done(t: asyncio.Task) -> None:
+        target.inflight.pop(key, None)
+        if not t.cancelled():
+            t.exception()  # Mark retrieved even if every waiter went away
+    task.add_done_callback(_done)
+    return await asyncio.shield(task)
+
+def _release_slot_on_close(response: httpx.Response, scheduler: RequestScheduler, priority: str) -> None:
+    """A streamed body keeps its pool connection busy until read - keep the slot until the response is closed"""
+    aclose = response.aclose
+    released = False
+
+    async def close() -> None:
+        nonlocal released
+        try:
+            await aclose()
+        finally:
+            if not released:
+                released = True
+                scheduler.release(priority)
+
+    response.aclose = close
+
+async def _send_with_retries(method: str, path: str, *, headers: Optional[Dict[str, str]] = None,
+                             retry: bool = True, stream: bool = False, **kwargs) -> httpx.Response:
+    """Send one logical request with retries, token renewal and circuit breaking"""
+    target = current_target()
+    endpoint = endpoint_label(method, path, "")
+    breaker = target.breakers.setdefault(endpoint, CircuitBreaker(endpoint))
+    idempotent = method.upper() in IDEMPOTENT_METHODS
+    attempts = config.RETRY_MAX_ATTEMPTS if retry else 1
+    renewed_token = False
+    client = _target_client(target)
+    
+    attempt = 0
+    while True:
+        with phase("auth"):
+            auth_headers = await get_pega_auth_headers()
+        request = client.build_request(method, f"{target.config.api_url}{path}", headers={**auth_headers, **(headers or {})}, **kwargs)
+        trace_hook = http_trace_hook()
+        if trace_hook is not None:
+            request.extensions["trace"] = trace_hook
+        breaker.before_request()
+        
+        try:
+            queued_at = time.perf_counter()
+            priority = current_priority()
+            await target.scheduler.wait(priority)
+            add_phase("queue", (time.perf_counter() - queued_at) * 1000)
+            try:
+                response = await client.send(request, stream=stream)
+            except BaseException:
+                target.scheduler.release(priority)
+                raise
+            if stream:
+                _release_slot_on_close(response, target.scheduler, priority)
+            else:
+                target.scheduler.release(priority)
+        except httpx.TransportError as e:
+            breaker.record(False)
+            retryable = idempotent or isinstance(e, httpx.ConnectError)
+            if not retryable or attempt + 1 >= attempts:
+                raise
+            reason = type(e).__name__
+            delay = _retry_delay(attempt, None)
+        except BaseException:
+            breaker.probe_in_flight = False
+            raise
+        else:
+            breaker.record(not _is_failure(response.status_code))
+            
+            if response.status_code == 401 and retry and not renewed_token:
+                renewed_token = True
+                await response.aclose()
+                with phase("auth"):
+                    await _renew_rejected_token(target, auth_headers)
+                continue
+            
+            retryable = _is_failure(response.status_code) and (idempotent or response.status_code == 429)
+            if not retryable or attempt + 1 >= attempts:
+                return response
+            reason = str(response.status_code)
+            delay = _retry_delay(attempt, response)
+            await response.aclose()
+        
+        metrics.inc("pega_retries_total", {"endpoint": endpoint, "reason": reason})
+        logger.info(f"Retrying {endpoint} after {reason} in {delay:.2f}s (attempt {attempt + 2}/{attempts})")
+        with phase("retry_wait"):
+            await asyncio.sleep(delay)
+        attempt += 1
+
+# ============================================================================
+# Reference Data Cache
+# ============================================================================
+
+# Bump when the shape of cached data changes, so entries written by older versions are ignored
+CACHE_FORMAT = 1
+
+class ReferenceCache:
+    """TTL cache with ETag revalidation for Pega data - LRU-bounded when max_entries is set.
+    
+    Keys are paths, scoped to the current target so targets never share entries.
+    With a store, entries are also written to it and read from it when the
+    local copy is missing or stale, so a restarted process or another worker
+    reuses earlier fetches. With stale_ttl, entries up to that age are served
+    while fetch_reference_json revalidates them in the background.
+    """
+    
+    def __init__(self, name: str, ttl: float, max_entries: int = 0,
+                 store: Optional[SharedStore] = None, stale_ttl: float = 0):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries  # 0 = unbounded
+        self.store = store
+        self.stale_ttl = stale_ttl
+        self._entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._refreshing: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "stale": 0, "loaded": 0, "background": 0}
+        metrics.register_collector(self._samples)
+    
+    def _samples(self):
+        samples = [("pega_cache_events_total", {"cache": self.name, "result": k}, v, "counter") for k, v in self.stats.items()]
+        samples.append(("pega_cache_entries", {"cache": self.name}, len(self._entries), "gauge"))
+        return samples
+    
+    @staticmethod
+    def _key(key: str) -> Tuple[str, str]:
+        return (current_target().name, key)
+    
+    def _store_key(self, key: Tuple[str, str]) -> str:
+        return f"cache:v{CACHE_FORMAT}:{self.name}:{key[0]}:{key[1]}"
+    
+    def _publish(self, key: Tuple[str, str]) -> None:
+        if self.store is not None:
+            # Kept well past freshness so it can still be revalidated or served stale
+            self.store.put_json(self._store_key(key), self._entries[key], ttl=max(self.stale_ttl, self.ttl * 10))
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        key = self._key(key)
+        entry = self._entries.get(key)
+        if self.store is not None and (entry is None or not self.is_fresh(entry)):
+            stored = self.store.get_json(self._store_key(key))
+            if stored and (entry is None or stored["fetched_at"] > entry["fetched_at"]):
+                self.stats["loaded"] += 1
+                entry = stored
+                self._entries[key] = entry
+        if entry is not None and self.max_entries:
+            # Mark as most recently used
+            self._entries[key] = self._entries.pop(key)
+        return entry
+    
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() < entry["fetched_at"] + self.ttl
+    
+    def is_servable(self, entry: Dict[str, Any]) -> bool:
+        """Stale, but young enough to serve while revalidating in the background"""
+        return time.time() < entry["fetched_at"] + self.stale_ttl
+    
+    def refresh_later(self, key: str, refresh: Callable[[], Awaitable[Any]]) -> None:
+        """Run refresh in the background unless one is already running for key"""
+        key = self._key(key)
+        if key in self._refreshing:
+            return
+        self.stats["background"] += 1
+        with use_priority(BACKGROUND):
+            task = asyncio.create_task(refresh())
+        self._refreshing[key] = task
+        
+        def _done(t: asyncio.Task) -> None:
+            self._refreshing.pop(key, None)
+            if not t.cancelled() and t.exception():
+                logger.warning(f"Background refresh of {key[1]} failed: {str(t.exception())}")
+        task.add_done_callback(_done)
+    
+    def put(self, key: str, data: Any, etag: Optional[str]) -> None:
+        key = self._key(key)
+        self._entries.pop(key, None)
+        self._entries[key] = {"data": data, "etag": etag, "fetched_at": time.time()}
+        self._publish(key)
+        if self.max_entries and len(self._entries) > self.max_entries:
+            # Evict the least recently used entry
+            del self._entries[next(iter(self._entries))]
+    
+    def touch(self, key: str) -> None:
+        key = self._key(key)
+        if key in self._entries:
+            self._entries[key]["fetched_at"] = time.time()
+            self._publish(key)
+    
+    def discard(self, key: str) -> None:
+        key = self._key(key)
+        self._entries.pop(key, None)
+        if self.store is not None:
+            self.store.delete(self._store_key(key))
+    
+    def invalidate(self, prefix: str = "") -> int:
+        """Drop the current target's entries whose key starts with prefix - all of them by default"""
+        name = current_target().name
+        keys = [k for k in self._entries if k[0] == name and k[1].startswith(prefix)]
+        for k in keys:
+            del self._entries[k]
+        if self.store is not None:
+            self.store.delete_prefix(self._store_key((name, prefix)))
+        return len(keys)
+
+# Case types, participant roles, attachment categories and bulk-action metadata,
+# shared by tools and resources and kept on disk
+reference_cache = ReferenceCache("reference", ttl=config.CASE_TYPE_CACHE_TTL, store=reference_store,
+                                 stale_ttl=config.REFERENCE_CACHE_MAX_AGE)
+
+# Case details with their eTags, kept in step with every write to a case
+case_cache = ReferenceCache("cases", ttl=config.CASE_CACHE_TTL, max_entries=config.CASE_CACHE_SIZE)
+
+def case_path(case_id: str) -> str:
+    """/cases/{id} with the ID quoted - Pega case IDs contain spaces ("MYORG-LOAN-WORK L-1001")"""
+    return f"/cases/{quote(case_id, safe='')}"
+
+def note_case_write(case_id: str, response: httpx.Response) -> None:
+    """Write-through for the case cache after any write to a case.
+    
+    A successful response carrying the updated case (data.caseInfo) and an
+    eTag replaces the cached entry; anything else drops it, so the next read
+    or write fetches the case again.
+    """
+    key = case_path(case_id)
+    etag = response.headers.get("etag")
+    if response.status_code < 300 and etag:
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and isinstance(data.get("data"), dict) and data["data"].get("caseInfo"):
+            case_cache.put(key, {"data": data["data"]}, etag)
+            return
+    case_cache.discard(key)
+
+async def fetch_reference_json(path: str, revalidate: bool = False, cache: Optional[ReferenceCache] = None,
+                               fields: Optional[List[Path]] = None) -> Tuple[Optional[Any], Optional[httpx.Response]]:
+    """GET a reference path through the cache.
+    
+    Returns (data, response). data is None when the request failed, response
+    is None when the answer came straight from the cache. With revalidate=True
+    the cache is always checked with Pega (If-None-Match when an ETag is held).
+    When Pega is failing, a cached entry is served stale unless revalidating.
+    An entry within the cache's stale_ttl is served at once and revalidated
+    in the background. Uses the shared reference_cache unless another cache
+    is given. With fields, only those paths of the body are parsed and cached.
+    """
+    cache = cache or reference_cache
+    entry = cache.get(path)
+    if entry and not revalidate and cache.is_fresh(entry):
+        cache.stats["hits"] += 1
+        return entry["data"], None
+    if entry and not revalidate and cache.is_servable(entry):
+        cache.stats["hits"] += 1
+        cache.refresh_later(path, lambda: fetch_reference_json(path, revalidate=True, cache=cache, fields=fields))
+        return entry["data"], None
+    
+    headers = {"If-None-Match": entry["etag"]} if entry and entry.get("etag") else None
+    
+    try:
+        response = await pega_request("GET", path, headers=headers)
+    except (CircuitOpenError, httpx.TransportError) as e:
+        # Serve the last known good answer while Pega is degraded
+        if entry and not revalidate:
+            cache.stats["stale"] += 1
+            logger.warning(f"Serving stale {path}: {str(e)}")
+            return entry["data"], None
+        raise
+    
+    if response.status_code == 304 and entry:
+        cache.stats["revalidated"] += 1
+        cache.touch(path)
+        return entry["data"], response
+    
+    if response.status_code == 200:
+        cache.stats["misses"] += 1
+        data = read_json(response, fields)
+        cache.put(path, data, response.headers.get("etag"))
+        return data, response
+    
+    if entry and not revalidate and _is_failure(response.status_code):
+        cache.stats["stale"] += 1
+        logger.warning(f"Serving stale {path}: status code {response.status_code}")
+        return entry["data"], None
+    
+    return None, response
+
+def format_error(error_msg: str, response: httpx.Response) -> str:
+    """Append Pega error details from a failed response"""
+    try:
+        error_data = response.json()
+        if 'error_description' in error_data:
+            error_msg += f": {error_data['error_description']}"
+        elif 'error' in error_data:
+            error_msg += f": {error_data['error']}"
+    except:
+        error_msg += f" - {response.text[:200]}"
+    return error_msg
+
+# ============================================================================
+# Health Prober
+# ============================================================================
+
+_health_probe_task: Optional[asyncio.Task] = None
+
+async def probe_pega_health() -> Dict[str, Any]:
+    """Run one live probe of the current target (a conditional GET of /casetypes) and update its snapshot"""
+    target = current_target()
+    health = target.health
+    start_time = time.time()
+    try:
+        data, response = await fetch_reference_json("/casetypes", revalidate=True)
+        error = "" if data is not None else format_error(f"HTTP {response.status_code}", response)
+    except httpx.TimeoutException:
+        error = f"Timeout after {target.config.TIMEOUT}s"
+    except Exception as e:
+        error = str(e)
+    latency_ms = (time.time() - start_time) * 1000
+    
+    health["checks"] += 1
+    health["last_check_at"] = time.time()
+    health["last_latency_ms"] = latency_ms
+    if error:
+        health["status"] = "error"
+        health["error_streak"] += 1
+        health["last_error"] = error
+    else:
+        health["status"] = "ok"
+        health["error_streak"] = 0
+        health["last_success_at"] = health["last_check_at"]
+        # Exponential moving average of successful probe latency
+        alpha = config.HEALTH_EWMA_ALPHA
+        avg = health["avg_latency_ms"]
+        health["avg_latency_ms"] = latency_ms if not avg else alpha * latency_ms + (1 - alpha) * avg
+    # Other worker processes read the background leader's snapshot instead of probing
+    shared_store.put_json(f"health:{target.name}", health, ttl=config.HEALTH_PROBE_INTERVAL * 2)
+    return health
+
+def _health_is_current(health: Dict[str, Any]) -> bool:
+    return health["checks"] > 0 and time.time() - health["last_check_at"] < config.HEALTH_PROBE_INTERVAL * 2
+
+def _adopt_shared_health(target: PegaTarget) -> bool:
+    """Take over a newer snapshot the background leader published"""
+    shared = shared_store.get_json(f"health:{target.name}")
+    if not shared or shared["last_check_at"] <= target.health["last_check_at"]:
+        return False
+    target.health.update(shared)
+    return True
+
+async def get_health(force: bool = False) -> Dict[str, Any]:
+    """Current target's health snapshot - probes live when forced or when the snapshot is out of date"""
+    target = current_target()
+    health = target.health
+    if not force and not _health_is_current(health):
+        _adopt_shared_health(target)
+    if force or not _health_is_current(health):
+        await probe_pega_health()
+    return health
+
+async def _probe_target(name: str) -> None:
+    with use_target(name):
+        try:
+            await probe_pega_health()
+        except Exception as e:
+            logger.warning(f"Health probe for {name} failed: {str(e)}")
+
+# Seconds between sweeps of expired entries from the on-disk stores
+STORE_PURGE_INTERVAL = 300
+
+def _purge_stores() -> None:
+    """Drop expired entries, so per-case reference entries do not pile up on disk"""
+    shared_store.purge_expired()
+    reference_store.purge_expired()
+
+async def _health_probe_loop() -> None:
+    last_purge = time.monotonic()
+    while True:
+        await asyncio.gather(*(_probe_target(t.name) for t in configured_targets()))
+        # The prober runs in one worker only, which makes it the place for store upkeep
+        if time.monotonic() - last_purge >= STORE_PURGE_INTERVAL:
+            await asyncio.to_thread(_purge_stores)
+            last_purge = time.monotonic()
+        await asyncio.sleep(config.HEALTH_PROBE_INTERVAL)
+
+def start_health_prober() -> None:
+    """Start the background health prober for all configured targets (called on server startup)"""
+    global _health_probe_task
+    if _health_probe_task is None or _health_probe_task.done():
+        with use_priority(BACKGROUND):
+            _health_probe_task = asyncio.create_task(_health_probe_loop())
+
+async def stop_health_prober() -> None:
+    """Stop the background health prober (called on server shutdown)"""
+    global _health_probe_task
+    if _health_probe_task is not None:
+        _health_probe_task.cancel()
+        try:
+            await _health_probe_task
+        except asyncio.CancelledError:
+            pass
+    _health_probe_task = None
+
+# ============================================================================
+# Background Leader
+# ============================================================================
+
+# With several worker processes only the holder of this lease runs the token
+# refresher and health prober; the others adopt its tokens and snapshots
+LEADER_LEASE = "lease:background-leader"
+
+_leader_task: Optional[asyncio.Task] = None
+_is_leader = False
+
+def is_background_leader() -> bool:
+    """Whether this process runs the background token refresher and health prober"""
+    return _is_leader
+
+def _leader_lease_ttl() -> float:
+    return max(config.HEALTH_PROBE_INTERVAL * 2, 10)
+
+async def _claim_leadership() -> None:
+    """Take or renew the lease, starting or stopping the background loops to match"""
+    global _is_leader
+    leader = shared_store.acquire_lease(LEADER_LEASE, _leader_lease_ttl())
+    if leader and not _is_leader:
+        _is_leader = True
+        if shared_store.enabled:
+            logger.info(f"Process {os.getpid()} is the background leader")
+        start_token_refresher()
+        start_health_prober()
+    elif not leader and _is_leader:
+        _is_leader = False
+        logger.info(f"Process {os.getpid()} lost the background leader lease")
+        await stop_health_prober()
+        await stop_token_refresher()
+
+async def _leader_loop() -> None:
+    while True:
+        await asyncio.sleep(_leader_lease_ttl() / 3)
+        await _claim_leadership()
+
+async def start_background_tasks() -> None:
+    """Elect the background leader and keep the lease renewed (called on server startup)"""
+    global _leader_task
+    if config.MCP_WORKERS > 1 and not shared_store.enabled:
+        raise RuntimeError(f"MCP_WORKERS={config.MCP_WORKERS} needs SHARED_STORE_PATH - "
+                           "without the shared store every worker would run the background loops")
+    await _claim_leadership()
+    if shared_store.enabled and (_leader_task is None or _leader_task.done()):
+        _leader_task = asyncio.create_task(_leader_loop())
+
+async def stop_background_tasks() -> None:
+    """Stop the background loops and hand the lease over (called on server shutdown)"""
+    global _leader_task, _is_leader
+    if _leader_task is not None:
+        _leader_task.cancel()
+        try:
+            await _leader_task
+        except asyncio.CancelledError:
+            pass
+    _leader_task = None
+    await stop_health_prober()
+    await stop_token_refresher()
+    if _is_leader:
+        shared_store.release_lease(LEADER_LEASE)
+    _is_leader = False
+
+def _health_samples():
+    samples = []
+    for target in targets.values():
+        health = target.health
+        labels = {"target": target.name}
+        samples += [
+            ("pega_health_up", labels, 1 if health["status"] == "ok" else 0, "gauge"),
+            ("pega_health_latency_ms", labels, health["last_latency_ms"], "gauge"),
+            ("pega_health_avg_latency_ms", labels, health["avg_latency_ms"], "gauge"),
+            ("pega_health_error_streak", labels, health["error_streak"], "gauge")
+        ]
+    return samples
+
+metrics.register_collector(_health_samples)
+
 # ============================================================================
 # Business Logic Functions (ServiceNow Style)
 # ============================================================================
 
-async def verify_pega_connectivity() -> str:
+async def verify_pega_connectivity(force: bool = False) -> str:
     """Verify connectivity to Pega Platform"""
-    url = f"{config.api_url}/casetypes"
-    
     try:
-        headers = await get_pega_auth_headers()
+        # Answered from the background prober's snapshot unless forced
+        snapshot = await get_health(force)
+        checked_ago = time.time() - snapshot["last_check_at"]
+        
+        if snapshot["status"] == "ok":
+            output = (f"Connected to Pega successfully in {snapshot['last_latency_ms']:.1f}ms "
+                      f"(avg {snapshot['avg_latency_ms']:.1f}ms, checked {checked_ago:.0f}s ago)")
+        else:
+            output = f"Connection failed: {snapshot['last_error']} ({snapshot['error_streak']} consecutive failures"
+            if snapshot["last_success_at"]:
+                output += f", last success {time.time() - snapshot['last_success_at']:.0f}s ago"
+            output += ")"
         
-        async with httpx.AsyncClient(timeout=httpx.Timeout(config.TIMEOUT), verify=config.VERIFY_SSL) as client:
-            start_time = time.time()
-            response = await client.get(url, headers=headers)
-            response_time = (time.time() - start_time) * 1000
+        return output
             
-            if response.status_code == 200:
-                output = f"Connected to Pega successfully in {response_time:.1f}ms"
-            else:
-                error_msg = f"Connection failed with status code {response.status_code}"
-                try:
-                    error_data = response.json()
-                    if 'error_description' in error_data:
-                        error_msg += f": {error_data['error_description']}"
-                    elif 'error' in error_data:
-                        error_msg += f": {error_data['error']}"
-                except:
-                    error_msg += f" - {response.text[:200]}"
-                output = error_msg
+    except Exception as e:
+        error_msg = f"Connectivity error: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+async def get_case_types() -> str:
+    """Get available case types"""
+    try:
+        data, response = await fetch_reference_json("/casetypes")
+        
+        if data is not None:
+            case_types = data.get('caseTypes', [])
             
-            return output
+            if case_types:
+                output = f"Found {len(case_types)} case types:\n"
+                for i, ct in enumerate(case_types, 1):
+                    name = ct.get('name', 'Unknown')
+                    case_id = ct.get('ID', ct.get('id', 'No ID'))
+                    output += f"  {i}. {name} (ID: {case_id})\n"
+            else:
+                output = "No case types found"
+        else:
+            output = format_error(f"Failed to get case types with status code {response.status_code}", response)
+        
+        return output
             
     except httpx.ConnectError as e:
         error_msg = f"Connection error to Pega Platform: {str(e)}"
@@ -156,45 +1146,24 @@ async def verify_pega_connectivity() -> str:
         logger.error(error_msg)
         return error_msg
     except Exception as e:
-        error_msg = f"Connectivity error: {str(e)}"
+        error_msg = f"Error getting case types: {str(e)}"
         logger.error(error_msg)
         return error_msg
 
-async def get_case_types() -> str:
-    """Get available case types"""
-    url = f"{config.api_url}/casetypes"
-    
+async def get_case_type_action(case_type_id: str, action_id: str) -> str:
+    """Get bulk action details for a case type"""
     try:
-        headers = await get_pega_auth_headers()
+        data, response = await fetch_reference_json(f"/casetypes/{case_type_id}/actions/{action_id}")
         
-        async with httpx.AsyncClient(timeout=httpx.Timeout(config.TIMEOUT), verify=config.VERIFY_SSL) as client:
-            response = await client.get(url, headers=headers)
-            
-            if response.status_code == 200:
-                data = response.json()
-                case_types = data.get('caseTypes', [])
-                
-                if case_types:
-                    output = f"Found {len(case_types)} case types:\n"
-                    for i, ct in enumerate(case_types, 1):
-                        name = ct.get('name', 'Unknown')
-                        case_id = ct.get('ID', ct.get('id', 'No ID'))
-                        output += f"  {i}. {name} (ID: {case_id})\n"
-                else:
-                    output = "No case types found"
-            else:
-                error_msg = f"Failed to get case types with status code {response.status_code}"
-                try:
-                    error_data = response.json()
-                    if 'error_description' in error_data:
-                        error_msg += f": {error_data['error_description']}"
-                    elif 'error' in error_data:
-                        error_msg += f": {error_data['error']}"
-                except:
-                    error_msg += f" - {response.text[:200]}"
-                output = error_msg
-            
-            return output
+        if data is not None:
+            details = json.dumps(data.get('data', data), indent=2)
+            if len(details) > config.MAX_OUTPUT_CHARS:
+                details = details[:config.MAX_OUTPUT_CHARS] + "\n... (truncated)"
+            output = f"Bulk action {action_id} for case type {case_type_id}:\n{details}"
+        else:
+            output = format_error(f"Failed to get action details with status code {response.status_code}", response)
+        
+        return output
             
     except httpx.ConnectError as e:
         error_msg = f"Connection error to Pega Platform: {str(e)}"
@@ -205,38 +1174,37 @@ async def get_case_types() -> str:
         logger.error(error_msg)
         return error_msg
     except Exception as e:
-        error_msg = f"Error getting case types: {str(e)}"
+        error_msg = f"Error getting action details: {str(e)}"
         logger.error(error_msg)
         return error_msg
 
+async def invalidate_case_type_cache() -> str:
+    """Drop cached case types and bulk-action metadata"""
+    removed = reference_cache.invalidate("/casetypes")
+    return f"Case type cache cleared ({removed} entries removed)"
+
+async def _post_case(case_type_id: str, content: Optional[Dict[str, Any]] = None) -> httpx.Response:
+    """POST a new case to Pega"""
+    payload: Dict[str, Any] = {"caseTypeID": case_type_id}
+    if content:
+        payload["content"] = content
+    
+    return await pega_request("POST", "/cases", json=payload)
+
 async def create_case(case_type_id: str) -> str:
     """Create a new case"""
-    url = f"{config.api_url}/cases"
-    payload = {"caseTypeID": case_type_id}
-    
     try:
-        headers = await get_pega_auth_headers()
+        response = await _post_case(case_type_id)
         
-        async with httpx.AsyncClient(timeout=httpx.Timeout(config.TIMEOUT), verify=config.VERIFY_SSL) as client:
-            response = await client.post(url, headers=headers, json=payload)
-            
-            if response.status_code in [200, 201]:
-                data = response.json()
-                case_id = data.get('ID', data.get('id', 'Unknown'))
-                output = f"Case created successfully with ID: {case_id}"
-            else:
-                error_msg = f"Failed to create case with status code {response.status_code}"
-                try:
-                    error_data = response.json()
-                    if 'error_description' in error_data:
-                        error_msg += f": {error_data['error_description']}"
-                    elif 'error' in error_data:
-                        error_msg += f": {error_data['error']}"
-                except:
-                    error_msg += f" - {response.text[:200]}"
-                output = error_msg
-            
-            return output
+        if response.status_code in [200, 201]:
+            data = response.json()
+            case_id = data.get('ID', data.get('id', 'Unknown'))
+            note_case_write(case_id, response)
+            output = f"Case created successfully with ID: {case_id}"
+        else:
+            output = format_error(f"Failed to create case with status code {response.status_code}", response)
+        
+        return output
             
     except httpx.ConnectError as e:
         error_msg = f"Connection error to Pega Platform: {str(e)}"
@@ -249,4 +1217,74 @@ async def create_case(case_type_id: str) -> str:
     except Exception as e:
         error_msg = f"Error creating case: {str(e)}"
         logger.error(error_msg)
-        return error_msg 
\ No newline at end of file
+        return error_msg
+
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+async def create_cases_batch(cases: List[Dict[str, Any]], progress: Optional[ProgressCallback] = None) -> str:
+    """Create many cases concurrently.
+    
+    Each item is {"caseTypeID": ..., "content": {...}} where content is optional.
+    At most BATCH_CONCURRENCY POSTs run at once; progress(done, total) is awaited
+    as items complete.
+    """
+    total = len(cases)
+    if total == 0:
+        return "No cases to create"
+    
+    semaphore = asyncio.Semaphore(config.BATCH_CONCURRENCY)
+    results: List[Dict[str, Any]] = [{} for _ in range(total)]
+    done = 0
+    report_every = max(1, total // 100)
+    
+    async def create_one(index: int, item: Dict[str, Any]) -> None:
+        nonlocal done
+        case_type_id = item.get('caseTypeID', '')
+        result: Dict[str, Any] = {"caseTypeID": case_type_id}
+        
+        async with semaphore:
+            try:
+                if not case_type_id:
+                    raise ValueError("missing caseTypeID")
+                response = await _post_case(case_type_id, item.get('content'))
+                if response.status_code in [200, 201]:
+                    data = response.json()
+                    result["ID"] = data.get('ID', data.get('id', 'Unknown'))
+                    note_case_write(result["ID"], response)
+                else:
+                    result["error"] = format_error(f"status code {response.status_code}", response)
+            except httpx.TimeoutException:
+                result["error"] = f"timeout after {config.TIMEOUT}s"
+            except Exception as e:
+                result["error"] = str(e)
+        
+        results[index] = result
+        done += 1
+        if progress and (done % report_every == 0 or done == total):
+            try:
+                await progress(done, total)
+            except Exception as e:
+                logger.debug(f"Progress report failed: {str(e)}")
+    
+    start_time = time.time()
+    # Scheduled as bulk so a large batch leaves room for interactive calls
+    with use_priority(BULK):
+        await asyncio.gather(*(create_one(i, item) for i, item in enumerate(cases)))
+    elapsed = time.time() - start_time
+    
+    created = [r for r in results if "ID" in r]
+    failed = [(i, r) for i, r in enumerate(results) if "error" in r]
+    
+    output = f"Created {len(created)} of {total} cases in {elapsed:.1f}s"
+    if failed:
+        output += f" ({len(failed)} failed)"
+    output += "\n"
+    if created:
+        output += "IDs: " + ", ".join(r["ID"] for r in created) + "\n"
+    if failed:
+        output += "Errors:\n"
+        for i, r in failed:
+            output += f"  #{i + 1} ({r['caseTypeID']}): {r['error']}\n"
+        logger.warning(f"Batch case creation: {len(failed)} of {total} failed")
+    
+    return output
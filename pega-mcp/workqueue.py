@@ -0,0 +1,405 @@
+"""
+Assignment Work Queue - Prefetching Worker Pool
+
+A run drains the operator's work queue server-side. Each worker claims the
+next assignment (GET /assignments/next) and loads its action details and eTag
+(GET /assignments/{ID}/actions/{actionID}) while the assignment it already
+holds is being submitted, so fetching never waits behind a PATCH.
+"""
+
+import time
+import uuid
+import asyncio
+import logging
+from urllib.parse import quote
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+import httpx
+from metrics import metrics
+from tools import config, current_target, pega_request, format_error, note_case_write, shared_store
+from scheduler import BULK, use_priority
+
+logger = logging.getLogger(__name__)
+
+# Called with the run ID whenever a run makes progress
+RunUpdateCallback = Callable[[str], Awaitable[None]]
+
+# Runs by ID - finished runs are pruned beyond QUEUE_RUN_HISTORY
+_runs: Dict[str, Dict[str, Any]] = {}
+
+MAX_RUN_ERRORS = 20
+
+# Seconds between update notifications while a run is busy
+NOTIFY_INTERVAL = 1.0
+
+# Seconds a run's status stays readable from other worker processes
+RUN_SNAPSHOT_TTL = 3600
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across all workers"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+# ============================================================================
+# Pega Calls
+# ============================================================================
+
+def _assignment_path(assignment_id: str, action_id: str) -> str:
+    # Assignment IDs contain spaces and '!' - keep them in one path segment
+    return f"/assignments/{quote(assignment_id, safe='')}/actions/{quote(action_id, safe='')}"
+
+async def _fetch_next(action_id: str) -> Optional[Dict[str, Any]]:
+    """Get the next assignment, or None when the queue is empty"""
+    response = await pega_request("GET", "/assignments/next", coalesce=False)
+    if response.status_code in [204, 404]:
+        return None
+    if response.status_code != 200:
+        return {"error": format_error(f"Next assignment failed with status code {response.status_code}", response)}
+
+    case_info = response.json().get('data', {}).get('caseInfo', {})
+    assignments = case_info.get('assignments') or []
+    if not assignments:
+        return None
+
+    assignment = assignments[0]
+    actions = assignment.get('actions') or []
+    item = {
+        "assignment_id": assignment.get('ID', ''),
+        "case_id": case_info.get('ID', ''),
+        "action_id": action_id or (actions[0].get('ID', '') if actions else '')
+    }
+    if not item["action_id"]:
+        item["error"] = f"{item['assignment_id']}: no actions available"
+    return item
+
+async def _load_action(item: Dict[str, Any]) -> Optional[str]:
+    """Fetch the action details for a claimed assignment, keeping its eTag"""
+    response = await pega_request("GET", _assignment_path(item["assignment_id"], item["action_id"]), coalesce=False)
+    if response.status_code != 200:
+        return format_error(f"{item['assignment_id']}: action details failed with status code {response.status_code}", response)
+    item["etag"] = response.headers.get("etag")
+    return None
+
+async def _submit(item: Dict[str, Any], content: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Perform the assignment action, reloading the eTag once on a conflict"""
+    path = _assignment_path(item["assignment_id"], item["action_id"])
+    for attempt in range(2):
+        headers = {"If-Match": item["etag"]} if item.get("etag") else None
+        response = await pega_request("PATCH", path, headers=headers, json={"content": content or {}})
+        if item["case_id"]:
+            note_case_write(item["case_id"], response)
+
+        if response.status_code in [200, 201]:
+            return None
+        if response.status_code not in [409, 412] or attempt:
+            break
+        error = await _load_action(item)
+        if error:
+            return error
+    return format_error(f"{item['assignment_id']}: submit failed with status code {response.status_code}", response)
+
+# ============================================================================
+# Workers
+# ============================================================================
+
+async def _claim(run: Dict[str, Any], state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Claim the next unseen assignment with its action details loaded.
+
+    Returns None when the queue is empty, max_items is reached or the queue is
+    stuck on an assignment that already failed in this run.
+    """
+    while not run["stopping"]:
+        if run["max_items"] and state["reserved"] >= run["max_items"]:
+            return None
+        state["reserved"] += 1
+        start_time = time.perf_counter()
+        try:
+            item = await _fetch_next(run["action_id"])
+        except Exception:
+            state["reserved"] -= 1
+            raise
+
+        if item is None or "error" in item:
+            state["reserved"] -= 1
+            if item is not None:
+                _record_error(run, item["error"])
+            return None
+
+        seen = state["seen"].get(item["assignment_id"])
+        if seen == "active":
+            # Pega handed back an assignment a worker is still submitting -
+            # wait for a submission to finish and ask again
+            state["reserved"] -= 1
+            run["duplicates"] += 1
+            async with state["done"]:
+                try:
+                    await asyncio.wait_for(state["done"].wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+            continue
+        if seen == "failed":
+            # A completed ID may come back as the next step of the same flow,
+            # but a failed one would be handed out forever
+            state["reserved"] -= 1
+            _record_error(run, f"{item['assignment_id']}: still at the head of the queue after failing; stopping")
+            run["stopping"] = True
+            return None
+
+        state["seen"][item["assignment_id"]] = "active"
+        error = await _load_action(item)
+        run["fetch_ms"] += (time.perf_counter() - start_time) * 1000
+        run["fetched"] += 1
+        if error:
+            item["error"] = error
+        item["ready_at"] = time.monotonic()
+        return item
+    return None
+
+async def _process(run: Dict[str, Any], state: Dict[str, Any], item: Dict[str, Any],
+                   content: Optional[Dict[str, Any]]) -> None:
+    """Submit one claimed assignment and record the outcome"""
+    error = item.get("error")
+    if not error:
+        await state["limiter"].wait()
+        lag_ms = (time.monotonic() - item["ready_at"]) * 1000
+        run["lag_ms"] += lag_ms
+        run["max_lag_ms"] = max(run["max_lag_ms"], lag_ms)
+        metrics.observe("pega_queue_lag_ms", None, lag_ms)
+
+        run["in_flight"] += 1
+        start_time = time.perf_counter()
+        try:
+            error = await _submit(item, content)
+        except httpx.TimeoutException:
+            error = f"{item['assignment_id']}: timeout after {config.TIMEOUT}s"
+        except Exception as e:
+            error = f"{item['assignment_id']}: {str(e)}"
+        finally:
+            run["in_flight"] -= 1
+            run["submit_ms"] += (time.perf_counter() - start_time) * 1000
+
+    if error:
+        run["failed"] += 1
+        _record_error(run, error)
+    else:
+        run["completed"] += 1
+    state["seen"][item["assignment_id"]] = "failed" if error else "completed"
+    metrics.inc("pega_queue_assignments_total", {"outcome": "failed" if error else "completed"})
+
+    async with state["done"]:
+        state["done"].notify_all()
+
+async def _worker(run: Dict[str, Any], state: Dict[str, Any], content: Optional[Dict[str, Any]],
+                  notify: Callable[[], Awaitable[None]]) -> None:
+    """Submit assignments one at a time, always holding the next one ready"""
+    pending = asyncio.create_task(_claim(run, state))
+    try:
+        while True:
+            item = await pending
+            if item is None:
+                break
+            pending = asyncio.create_task(_claim(run, state))
+            await _process(run, state, item, content)
+            await notify()
+    finally:
+        pending.cancel()
+
+# ============================================================================
+# Run Management
+# ============================================================================
+
+def _record_error(run: Dict[str, Any], error: str) -> None:
+    if len(run["errors"]) < MAX_RUN_ERRORS:
+        run["errors"].append(error)
+
+def _publish(run: Dict[str, Any]) -> None:
+    """Share the run's progress with other worker processes"""
+    shared_store.put_json(f"work-queue:{run['id']}", {k: v for k, v in run.items() if k != "task"}, ttl=RUN_SNAPSHOT_TTL)
+
+def _prune_runs() -> None:
+    """Drop the oldest finished runs beyond QUEUE_RUN_HISTORY"""
+    finished = [r for r in _runs.values() if r["status"] not in ("queued", "running")]
+    finished.sort(key=lambda r: r["created_at"])
+    for run in finished[:max(len(finished) - config.QUEUE_RUN_HISTORY, 0)]:
+        del _runs[run["id"]]
+
+async def _run_queue(run: Dict[str, Any], content: Optional[Dict[str, Any]],
+                     on_update: Optional[RunUpdateCallback]) -> None:
+    """Run the worker pool until the queue is drained, stopped or max_items is reached"""
+    state: Dict[str, Any] = {
+        "seen": {},
+        "reserved": 0,
+        "done": asyncio.Condition(),
+        "limiter": RateLimiter(run["rate_limit"])
+    }
+    last_notified = 0.0
+
+    async def notify(force: bool = False) -> None:
+        nonlocal last_notified
+        if not force and time.monotonic() - last_notified < NOTIFY_INTERVAL:
+            return
+        last_notified = time.monotonic()
+        _publish(run)
+        if not on_update:
+            return
+        try:
+            await on_update(run["id"])
+        except Exception as e:
+            logger.debug(f"Work queue update notification failed: {str(e)}")
+
+    run["status"] = "running"
+    run["started_at"] = time.time()
+    await notify(force=True)
+    try:
+        results = await asyncio.gather(*(_worker(run, state, content, notify) for _ in range(run["workers"])),
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                _record_error(run, str(result))
+        if any(isinstance(result, Exception) for result in results):
+            run["status"] = "failed"
+        elif run["stopping"] and run["requested_stop"]:
+            run["status"] = "stopped"
+        else:
+            run["status"] = "completed" if not run["errors"] else "completed_with_errors"
+    except asyncio.CancelledError:
+        run["status"] = "stopped"
+        raise
+    finally:
+        run["finished_at"] = time.time()
+        logger.info(f"Work queue run {run['id']} {run['status']}: {run['completed']} completed, {run['failed']} failed")
+        await notify(force=True)
+        _prune_runs()
+
+async def start_work_queue(action_id: str = "", content: Optional[Dict[str, Any]] = None, workers: int = 0,
+                           rate_limit: Optional[float] = None, max_items: int = 0,
+                           on_update: Optional[RunUpdateCallback] = None) -> str:
+    """Start draining the current target's work queue in the background and return its handle immediately"""
+    target = current_target().name
+    for run in _runs.values():
+        if run["target"] == target and run["status"] in ("queued", "running"):
+            return f"Work queue run {run['id']} is already running on {target}. Stop it before starting another"
+
+    run_id = uuid.uuid4().hex[:12]
+    run: Dict[str, Any] = {
+        "id": run_id,
+        "target": target,
+        "action_id": action_id,
+        "status": "queued",
+        "workers": max(workers or config.QUEUE_WORKERS, 1),
+        "rate_limit": config.QUEUE_RATE_LIMIT if rate_limit is None else rate_limit,
+        "max_items": max(max_items, 0),
+        "fetched": 0,
+        "completed": 0,
+        "failed": 0,
+        "in_flight": 0,
+        "duplicates": 0,
+        "fetch_ms": 0.0,
+        "submit_ms": 0.0,
+        "lag_ms": 0.0,
+        "max_lag_ms": 0.0,
+        "errors": [],
+        "stopping": False,
+        "requested_stop": False,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None
+    }
+    _runs[run_id] = run
+    with use_priority(BULK):
+        run["task"] = asyncio.create_task(_run_queue(run, content, on_update))
+
+    rate = f"{run['rate_limit']:g}/s" if run["rate_limit"] > 0 else "no rate cap"
+    return (f"Work queue run {run_id} started with {run['workers']} workers ({rate}). "
+            f"Track it at pega://work-queues/{run_id}")
+
+def format_run_status(run_id: str) -> str:
+    """Format throughput, queue lag and progress of a run"""
+    run = _runs.get(run_id) or shared_store.get_json(f"work-queue:{run_id}")
+    if not run:
+        return f"Work queue run {run_id} not found"
+
+    end = run["finished_at"] or time.time()
+    elapsed = end - run["started_at"] if run["started_at"] else 0.0
+    submitted = run["completed"] + run["failed"]
+    throughput = run["completed"] / elapsed if elapsed else 0.0
+    avg_lag = run["lag_ms"] / submitted if submitted else 0.0
+    avg_fetch = run["fetch_ms"] / run["fetched"] if run["fetched"] else 0.0
+    avg_submit = run["submit_ms"] / submitted if submitted else 0.0
+    rate = f"{run['rate_limit']:g}/s" if run["rate_limit"] > 0 else "none"
+
+    output = f"""Work Queue Run: {run_id}
+Target: {run['target']}
+Action: {run['action_id'] or 'first available per assignment'}
+Status: {run['status']}
+Workers: {run['workers']}, rate cap: {rate}{f", max items: {run['max_items']}" if run['max_items'] else ''}
+Completed: {run['completed']}
+Failed: {run['failed']}
+In flight: {run['in_flight']}
+Throughput: {throughput:.2f} assignments/s
+Queue lag: avg {avg_lag:.1f}ms, max {run['max_lag_ms']:.1f}ms
+Fetch (next + action details): avg {avg_fetch:.1f}ms
+Submit: avg {avg_submit:.1f}ms
+Duplicate claims: {run['duplicates']}
+Elapsed: {elapsed:.1f}s"""
+    if run["errors"]:
+        output += "\nErrors:\n" + "\n".join(f"  - {e}" for e in run["errors"])
+    return output
+
+def list_runs() -> str:
+    """Summarize all known runs"""
+    if not _runs:
+        return "No work queue runs"
+
+    output = f"Work queue runs ({len(_runs)}):\n"
+    for run in sorted(_runs.values(), key=lambda r: r["created_at"], reverse=True):
+        output += f"- {run['id']}: {run['status']} ({run['completed']} completed, {run['failed']} failed)\n"
+    return output
+
+async def stop_work_queue(run_id: str) -> str:
+    """Stop a run after the assignments being submitted finish"""
+    run = _runs.get(run_id)
+    if not run:
+        if shared_store.get_json(f"work-queue:{run_id}"):
+            return f"Work queue run {run_id} runs in another worker process and can only be stopped there"
+        return f"Work queue run {run_id} not found"
+    if run["status"] not in ("queued", "running"):
+        return f"Work queue run {run_id} already {run['status']}"
+
+    run["stopping"] = True
+    run["requested_stop"] = True
+    try:
+        await asyncio.wait_for(asyncio.shield(run["task"]), timeout=config.TIMEOUT)
+    except asyncio.TimeoutError:
+        run["task"].cancel()
+        try:
+            await run["task"]
+        except asyncio.CancelledError:
+            pass
+    return f"Work queue run {run_id} stopped after {run['completed']} completed, {run['failed']} failed"
+
+async def shutdown_work_queues() -> None:
+    """Cancel running runs (called on server shutdown)"""
+    for run in list(_runs.values()):
+        if run["status"] in ("queued", "running"):
+            run["task"].cancel()
+            try:
+                await run["task"]
+            except asyncio.CancelledError:
+                pass
+
+metrics.describe("pega_queue_lag_ms", "Time a prefetched assignment waited before its submission started")
+metrics.describe("pega_queue_assignments_total", "Work queue assignments submitted by outcome")